@@ -0,0 +1,53 @@
+import hashlib
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+from typing import Callable, Optional
+
+
+class CachedResponse:
+    body: bytes
+    etag: str
+    expires_at: float
+
+    def __init__(self, body: bytes, expires_at: float):
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self.expires_at = expires_at
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        if not if_none_match:
+            return False
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or self.etag in tags
+
+
+class ResponseCache:
+    """Serialized response bodies and their ETags, by route and query parameters.
+
+    Entries expire after ttl seconds and the least recently used ones are evicted past max_entries.
+    Subscribe invalidate to the data store so any data change drops every cached body at once.
+    """
+
+    def __init__(self, ttl: float = 300, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, CachedResponse] = OrderedDict()
+
+    def get_or_build(self, key: Hashable, build: Callable[[], bytes]) -> CachedResponse:
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+        self.misses += 1
+        entry = self._entries[key] = CachedResponse(build(), time.monotonic() + self.ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self) -> None:
+        self._entries.clear()
@@ -0,0 +1,86 @@
+import json
+import re
+from typing import Any, Callable, Optional
+
+_NON_DIGITS = re.compile(r"\D")
+
+
+def normalize_name(name: str) -> str:
+    return " ".join(name.casefold().split())
+
+
+def normalize_phone(phone: str) -> str:
+    return _NON_DIGITS.sub("", phone)
+
+
+def serialize(content: Any) -> bytes:
+    # Same encoding FastAPI's JSONResponse uses, so cached bodies are byte-identical
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class DataStore:
+    """Bookings and flights loaded once, with hash indexes for every lookup the API serves.
+
+    Bodies for single-key lookups are serialized up front, filtered booking queries return the
+    matching rows in their original order. Callbacks registered with subscribe run whenever the
+    data is replaced.
+    """
+
+    def __init__(self, bookings: list[dict[str, Any]], flights: list[dict[str, Any]]):
+        self._subscribers: list[Callable[[], None]] = []
+        self._load(bookings, flights)
+
+    def subscribe(self, callback: Callable[[], None]) -> None:
+        self._subscribers.append(callback)
+
+    def reload(self, bookings: list[dict[str, Any]], flights: list[dict[str, Any]]) -> None:
+        self._load(bookings, flights)
+        for callback in self._subscribers:
+            callback()
+
+    def _load(self, bookings: list[dict[str, Any]], flights: list[dict[str, Any]]) -> None:
+        self.bookings = bookings
+        self.flights = flights
+        self.bookings_by_id: dict[int, dict[str, Any]] = {}
+        self.bookings_by_flight: dict[str, list[dict[str, Any]]] = {}
+        self.bookings_by_name: dict[str, list[dict[str, Any]]] = {}
+        self.bookings_by_phone: dict[str, list[dict[str, Any]]] = {}
+        for booking in bookings:
+            self.bookings_by_id[booking["id"]] = booking
+            self.bookings_by_flight.setdefault(booking["flight"], []).append(booking)
+            self.bookings_by_name.setdefault(normalize_name(booking["name"]), []).append(booking)
+            self.bookings_by_phone.setdefault(normalize_phone(booking["phone"]), []).append(booking)
+        self.flights_by_id = {flight["id"]: flight for flight in flights}
+
+        self.all_bookings_body = serialize({"bookings": bookings})
+        self.all_flights_body = serialize({"flights": flights})
+        self.booking_bodies = {booking_id: serialize({"booking": b}) for booking_id, b in self.bookings_by_id.items()}
+        self.flight_bodies = {flight_id: serialize({"flight": f}) for flight_id, f in self.flights_by_id.items()}
+        self.flights_list_bodies = {flight_id: serialize({"flights": [f]}) for flight_id, f in self.flights_by_id.items()}
+        self.empty_flights_body = serialize({"flights": []})
+
+    def find_bookings(self, flight: Optional[str] = None, name: Optional[str] = None, phone: Optional[str] = None) -> list[dict[str, Any]]:
+        # Start from the narrowest index and check the remaining criteria on those rows only
+        candidates = []
+        if flight:
+            candidates.append(self.bookings_by_flight.get(flight, []))
+        if name:
+            candidates.append(self.bookings_by_name.get(normalize_name(name), []))
+        if phone:
+            candidates.append(self.bookings_by_phone.get(normalize_phone(phone), []))
+        if not candidates:
+            return self.bookings
+        smallest = min(candidates, key=len)
+        others = [{id(b) for b in c} for c in candidates if c is not smallest]
+        return [b for b in smallest if all(id(b) in other for other in others)]
+
+    def with_flight(self, booking: dict[str, Any]) -> dict[str, Any]:
+        return {**booking, "flight_details": self.flights_by_id.get(booking["flight"])}
+
+    def lookup(self, booking_queries: list[dict[str, Optional[str]]], flight_ids: list[str]) -> dict[str, Any]:
+        # One result list per booking query (each booking with its flight joined), one flight or
+        # None per requested id, both in request order
+        return {
+            "bookings": [[self.with_flight(b) for b in self.find_bookings(**query)] for query in booking_queries],
+            "flights": [self.flights_by_id.get(flight_id) for flight_id in flight_ids],
+        }
@@ -1,15 +1,17 @@
 import logging
 import os
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
 
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, Response
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 
 from data.load_data import get_bookings_data, get_flights_data
+from data.cache import ResponseCache
+from data.store import DataStore, serialize
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("voicerag")
@@ -19,12 +21,39 @@ class BookingOptions(BaseModel):
     meals: Optional[str] = None
     delay: Optional[str] = None
 
+class BookingQuery(BaseModel):
+    flight: Optional[str] = None
+    name: Optional[str] = None
+    phone: Optional[str] = None
+
+class LookupRequest(BaseModel):
+    bookings: list[BookingQuery] = Field(default_factory=list, max_length=20)
+    flights: list[str] = Field(default_factory=list, max_length=20)
+
 class BookingUpdateRequest(BaseModel):
     phone: str
     options: BookingOptions
 
 app = FastAPI()
 
+# Loaded once, every lookup below is a dictionary access on this store
+store = DataStore(get_bookings_data(), get_flights_data())
+
+# Responses by path and query, dropped whenever the store's data changes. Clients may reuse a
+# response for CACHE_MAX_AGE seconds and revalidate it with If-None-Match after that
+response_cache = ResponseCache(ttl=float(os.getenv("API_CACHE_TTL", 300)))
+store.subscribe(response_cache.invalidate)
+CACHE_MAX_AGE = int(os.getenv("API_CACHE_MAX_AGE", 30))
+
+def cached_json(request: Request, build: Callable[[], bytes]) -> Response:
+    key = (request.url.path, tuple(sorted(request.query_params.multi_items())))
+    entry = response_cache.get_or_build(key, build)
+    # Bookings carry personal data, keep them out of shared caches
+    headers = {"ETag": entry.etag, "Cache-Control": f"private, max-age={CACHE_MAX_AGE}"}
+    if entry.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
 @app.on_event("startup")
 async def startup_event():
     if not os.environ.get("RUNNING_IN_PRODUCTION"):
@@ -36,41 +65,44 @@ async def read_root():
     return 'hello with Stu and Ms flights'
 
 @app.get("/api/bookings")
-async def get_bookings(flight: Optional[str] = None, name: Optional[str] = None):
-    bookings = get_bookings_data()
-    if flight:
-        bookings = [b for b in bookings if b["flight"] == flight]
-    if name:
-        bookings = [b for b in bookings if b["name"].lower() == name.lower()]
-    return {"bookings": bookings}
+async def get_bookings(request: Request, flight: Optional[str] = None, name: Optional[str] = None, phone: Optional[str] = None):
+    if not flight and not name and not phone:
+        return cached_json(request, lambda: store.all_bookings_body)
+    return cached_json(request, lambda: serialize({"bookings": store.find_bookings(flight, name, phone)}))
 
 @app.get("/api/bookings/{booking_id}")
-async def get_booking(booking_id: int):
-    bookings = get_bookings_data()
-    booking = next((b for b in bookings if b["id"] == booking_id), None)
-    if not booking:
+async def get_booking(request: Request, booking_id: int):
+    if booking_id not in store.booking_bodies:
         raise HTTPException(status_code=404, detail="Booking not found")
-    return {"booking": booking}
+    return cached_json(request, lambda: store.booking_bodies[booking_id])
 
 @app.get("/api/flights")
-async def get_flights(flight: Optional[str] = None):
-    flights = get_flights_data()
-    if flight:
-        flights = [f for f in flights if f["id"] == flight]
-    return {"flights": flights}
+async def get_flights(request: Request, flight: Optional[str] = None):
+    if not flight:
+        return cached_json(request, lambda: store.all_flights_body)
+    return cached_json(request, lambda: store.flights_list_bodies.get(flight, store.empty_flights_body))
 
 @app.get("/api/flights/{flight_id}")
-async def get_flight_by_id(flight_id: str):
+async def get_flight_by_id(request: Request, flight_id: str):
     """
     Retrieve a specific flight by its ID.
     
     - **flight_id**: The unique identifier of the flight.
     """
-    flights = get_flights_data()
-    flight = next((f for f in flights if f["id"] == flight_id), None)
-    if not flight:
+    if flight_id not in store.flight_bodies:
         raise HTTPException(status_code=404, detail="Flight not found")
-    return {"flight": flight}
+    return cached_json(request, lambda: store.flight_bodies[flight_id])
+
+@app.post("/api/lookup")
+async def lookup(request: LookupRequest):
+    """
+    Resolve several booking queries and flights in one request.
+
+    Each booking comes with its flight under **flight_details**. Results are returned in request
+    order: a list of bookings per query and a flight (or null) per flight id.
+    """
+    result = store.lookup([q.model_dump() for q in request.bookings], request.flights)
+    return Response(content=serialize(result), media_type="application/json", headers={"Cache-Control": "no-store"})
 
 if __name__ == "__main__":
     import uvicorn
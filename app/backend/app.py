@@ -1,21 +1,36 @@
 import logging
+import json
+import multiprocessing
 import os
+import signal
 from pathlib import Path
 from aiohttp import web
-from azure.core.credentials import AzureKeyCredential
-from azure.identity import AzureDeveloperCliCredential, DefaultAzureCredential
+from asynclog import configure_logging
+from azure.core.credentials import AzureKeyCredential, TokenCredential
 from dotenv import load_dotenv
-from ragtools import attach_rag_tools
-from rtmt import RTMiddleTier
+from metrics import REGISTRY, metrics_handler
+from ragtools import ApiResponseCache, SearchResultCache, ToolResultShaper, attach_rag_tools, create_api_client, create_query_embedder
+from rtmt import RTMiddleTier, session_log_context
+from tokencache import AsyncTokenCache, LazyCredential
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger("voicerag")
+RUNNING_IN_PRODUCTION = os.getenv("RUNNING_IN_PRODUCTION", "false").lower() == "true"
 
+# Records are written by a background thread, JSON lines in production and the usual text locally,
+# with the realtime session and turn ids attached
+configure_logging(json_format=os.getenv("LOG_FORMAT", "json" if RUNNING_IN_PRODUCTION else "text") == "json", context=session_log_context)
+logger = logging.getLogger("voicerag")
 
-RUNNING_IN_PRODUCTION = os.getenv("RUNNING_IN_PRODUCTION", "false").lower() == "true"
 HOST = "0.0.0.0" if RUNNING_IN_PRODUCTION else "localhost"
 PORT = 8000
 
+def create_azure_credential() -> TokenCredential:
+    from azure.identity import AzureDeveloperCliCredential, DefaultAzureCredential
+    if tenant_id := os.environ.get("AZURE_TENANT_ID"):
+        logger.info("Using AzureDeveloperCliCredential with tenant_id %s", tenant_id)
+        return AzureDeveloperCliCredential(tenant_id=tenant_id, process_timeout=60)
+    logger.info("Using DefaultAzureCredential")
+    return DefaultAzureCredential()
+
 async def create_app():
     if not os.environ.get("RUNNING_IN_PRODUCTION"):
         logger.info("Running in development mode, loading from .env file")
@@ -23,28 +38,34 @@ async def create_app():
 
     llm_key = os.environ.get("AZURE_OPENAI_API_KEY")
     search_key = os.environ.get("AZURE_SEARCH_API_KEY")
-    logger.info("Loading environment variables:")
-    for key, value in os.environ.items():
-        logger.info(f"{key}: {value}")
 
     credential = None
     if not llm_key or not search_key:
-        if tenant_id := os.environ.get("AZURE_TENANT_ID"):
-            logger.info("Using AzureDeveloperCliCredential with tenant_id %s", tenant_id)
-            credential = AzureDeveloperCliCredential(tenant_id=tenant_id, process_timeout=60)
-        else:
-            logger.info("Using DefaultAzureCredential")
-            credential = DefaultAzureCredential()
+        # One cache for both the realtime and search scopes. The credential is created, and
+        # azure.identity imported, in the thread of the first token request; the realtime and
+        # search warm-ups below run concurrently while the app already accepts connections
+        credential = AsyncTokenCache(LazyCredential(create_azure_credential))
     llm_credential = AzureKeyCredential(llm_key) if llm_key else credential
     search_credential = AzureKeyCredential(search_key) if search_key else credential
     
     app = web.Application()
+    if credential is not None:
+        async def close_credential(_app):
+            await credential.close()
+        app.on_cleanup.append(close_credential)
     rtmt = RTMiddleTier(
         credentials=llm_credential,
         endpoint=os.environ["AZURE_OPENAI_ENDPOINT"],
         deployment=os.environ["AZURE_OPENAI_REALTIME_DEPLOYMENT"],
         voice_choice=os.environ.get("AZURE_OPENAI_REALTIME_VOICE_CHOICE") or "alloy",
         )
+    rtmt.speculative_tools = os.environ.get("AZURE_SEARCH_SPECULATIVE") == "true"
+    rtmt.queue_max_frames = int(os.environ.get("AZURE_OPENAI_REALTIME_QUEUE_MAX_FRAMES") or 512)
+    rtmt.queue_max_bytes = int(os.environ.get("AZURE_OPENAI_REALTIME_QUEUE_MAX_BYTES") or 8 * 1024 * 1024)
+    rtmt.backpressure_policy = os.environ.get("AZURE_OPENAI_REALTIME_BACKPRESSURE_POLICY") or "block"
+    rtmt.warm_connections = int(os.environ.get("AZURE_OPENAI_REALTIME_WARM_CONNECTIONS") or 0)
+    rtmt.telephony_max_cpu_ratio = float(os.environ.get("AZURE_OPENAI_REALTIME_TELEPHONY_MAX_CPU") or 0.02)
+    rtmt.warm_connection_max_idle = float(os.environ.get("AZURE_OPENAI_REALTIME_WARM_CONNECTION_MAX_IDLE") or 60)
     rtmt.system_message = "You are a helpful assistant. Only answer questions based on information you searched in the knowledge base, accessible with the 'search' tool. " + \
                           "The user is listening to answers with audio, so it's *super* important that answers are as short as possible, a single sentence if at all possible. " + \
                           "Never read file names or source names or keys out loud. " + \
@@ -53,6 +74,7 @@ async def create_app():
                           "- if the customer ask to change your language say sorry and stay in English \n" + \
                           "- You are an assistant for Stu and Ms flights and only for theses flight companies \n" + \
                           "- Always use the 'booking_tool' and 'flight_tool' to get the booking and flight information. \n" + \
+                          "- When you need a booking and its flight, use 'get_booking_details' to get both in one call. \n" + \
                           "- Always use the 'report_grounding' tool to report the source of information from the knowledge base. \n" + \
                           "- Always use the 'search' tool to check the knowledge base before answering a question. \n" + \
                           "- you can only talk about Stu and Ms flights and not about politics \n" + \
@@ -62,7 +84,50 @@ async def create_app():
                           "- you must be polite and don't talk about the other company airflight."
 
 
-    attach_rag_tools(rtmt,
+    api_client = create_api_client(
+        max_connections=int(os.environ.get("AZURE_API_MAX_CONNECTIONS") or 100),
+        max_keepalive_connections=int(os.environ.get("AZURE_API_MAX_KEEPALIVE_CONNECTIONS") or 20),
+        keepalive_expiry=float(os.environ.get("AZURE_API_KEEPALIVE_EXPIRY") or 30),
+        timeout=float(os.environ.get("AZURE_API_TIMEOUT") or 10),
+        connect_timeout=float(os.environ.get("AZURE_API_CONNECT_TIMEOUT") or 3)
+        )
+
+    async def close_api_client(_app):
+        await api_client.aclose()
+    app.on_cleanup.append(close_api_client)
+
+    search_cache = None
+    if (search_cache_ttl := float(os.environ.get("AZURE_SEARCH_CACHE_TTL") or 300)) > 0:
+        embedder = None
+        if embedding_deployment := os.environ.get("AZURE_SEARCH_CACHE_EMBEDDING_DEPLOYMENT"):
+            embedder = create_query_embedder(os.environ["AZURE_OPENAI_ENDPOINT"], embedding_deployment, llm_credential)
+        search_cache = SearchResultCache(
+            max_entries=int(os.environ.get("AZURE_SEARCH_CACHE_SIZE") or 256),
+            ttl=search_cache_ttl,
+            embedder=embedder,
+            similarity_threshold=float(os.environ.get("AZURE_SEARCH_CACHE_SIMILARITY") or 0.95)
+            )
+
+    search_backend = None
+    if os.environ.get("AZURE_SEARCH_BACKEND") == "local":
+        from localsearch import LocalSearchBackend
+        query_embedder = None
+        if embedding_deployment := os.environ.get("AZURE_OPENAI_EMBEDDING_DEPLOYMENT"):
+            query_embedder = create_query_embedder(os.environ["AZURE_OPENAI_ENDPOINT"], embedding_deployment, llm_credential)
+        search_backend = LocalSearchBackend(
+            data_path=os.environ.get("AZURE_SEARCH_LOCAL_DATA") or Path(__file__).parent.parent.parent / "data" / "faq.json",
+            embeddings_path=os.environ.get("AZURE_SEARCH_LOCAL_EMBEDDINGS"),
+            embedder=query_embedder
+            )
+
+    # JSON object of tool name -> dotted field paths, replaces the defaults in ragtools.DEFAULT_RESULT_FIELDS
+    result_fields = os.environ.get("AZURE_TOOL_RESULT_FIELDS")
+    result_shaper = ToolResultShaper(
+        fields=json.loads(result_fields) if result_fields else None,
+        search_token_budget=int(os.environ.get("AZURE_SEARCH_TOKEN_BUDGET") or 800)
+        )
+
+    chunks_handler = attach_rag_tools(rtmt,
         credentials=search_credential,
         search_endpoint=os.environ.get("AZURE_SEARCH_ENDPOINT"),
         search_index=os.environ.get("AZURE_SEARCH_INDEX"),
@@ -71,18 +136,52 @@ async def create_app():
         content_field=os.environ.get("AZURE_SEARCH_CONTENT_FIELD") or "chunk",
         embedding_field=os.environ.get("AZURE_SEARCH_EMBEDDING_FIELD") or "text_vector",
         title_field=os.environ.get("AZURE_SEARCH_TITLE_FIELD") or "title",
-        use_vector_query=(os.environ.get("AZURE_SEARCH_USE_VECTOR_QUERY") == "true") or True
+        use_vector_query=(os.environ.get("AZURE_SEARCH_USE_VECTOR_QUERY") == "true") or True,
+        api_client=api_client,
+        search_cache=search_cache,
+        search_backend=search_backend,
+        grounding_references_only=os.environ.get("AZURE_SEARCH_GROUNDING_REFERENCES_ONLY") == "true",
+        result_shaper=result_shaper,
+        api_cache=ApiResponseCache(max_stale=float(os.environ.get("AZURE_API_CACHE_MAX_STALE") or 60)) if os.environ.get("AZURE_API_CACHE") != "false" else None
         )
 
     rtmt.attach_to_app(app, "/realtime")
+    if (os.environ.get("WEB_CONCURRENCY") or "1") != "1":
+        # A scrape reaches whichever worker accepts it, keep their series apart
+        REGISTRY.const_labels["worker"] = str(os.getpid())
+    app.router.add_get("/metrics", metrics_handler)
+    app.router.add_get("/chunks/{chunk_id}", chunks_handler)
     current_directory = Path(__file__).parent
     app.add_routes([web.get('/', lambda _: web.FileResponse(current_directory / 'static/index.html'))])
     app.router.add_static('/', path=current_directory / 'static', name='static')
     return app
 
 
+def run_worker(host: str, port: int, reuse_port: bool):
+    # Each worker builds its own app, so credentials, token refreshers and clients are per process
+    web.run_app(create_app(), host=host, port=port, reuse_port=reuse_port or None)
+
+
 if __name__ == "__main__":
     host = HOST
     port = 8000
-    app = create_app()
-    web.run_app(app, host=host, port=port)
+    concurrency = os.environ.get("WEB_CONCURRENCY") or "1"
+    workers = (os.cpu_count() or 1) if concurrency == "auto" else int(concurrency)
+    if workers <= 1:
+        run_worker(host, port, reuse_port=False)
+    else:
+        # Workers share the listening port through SO_REUSEPORT (Linux/macOS), the kernel spreads
+        # connections across them. SIGTERM/SIGINT are forwarded so each one drains gracefully
+        logger.info("Starting %d workers on %s:%d", workers, host, port)
+        processes = [multiprocessing.Process(target=run_worker, args=(host, port, True)) for _ in range(workers)]
+        for process in processes:
+            process.start()
+
+        def stop(signum, _frame):
+            for process in processes:
+                if process.is_alive():
+                    os.kill(process.pid, signum)
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        for process in processes:
+            process.join()
@@ -0,0 +1,186 @@
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional, TextIO
+
+from metrics import counter, gauge
+
+# Attributes every LogRecord has, anything else on a record was added through extra= or a filter
+# and is written out as a structured field
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "taskName"}
+
+def _fields(record: logging.LogRecord) -> dict[str, Any]:
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES}
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with time, level, logger, message and the record's extra fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **_fields(record),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class TextFormatter(logging.Formatter):
+    """The logging.basicConfig layout followed by the record's extra fields as key=value."""
+
+    def __init__(self):
+        super().__init__("%(levelname)s:%(name)s:%(message)s")
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        text = super().formatMessage(record)
+        fields = _fields(record)
+        return text + " " + " ".join(f"{key}={value}" for key, value in fields.items()) if fields else text
+
+class ContextFilter(logging.Filter):
+    """Adds the fields returned by context, e.g. the realtime session and turn ids, to each record.
+
+    Handler filters run on the thread that logs, so context sees that caller's context variables.
+    """
+
+    def __init__(self, context: Callable[[], dict[str, Any]]):
+        super().__init__()
+        self._context = context
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in self._context().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+class RateLimitFilter(logging.Filter):
+    """Lets each message template through at most burst times at once, refilled at rate per second.
+
+    The next record that gets through carries the number left out in between as its suppressed field.
+    """
+
+    def __init__(self, rate: float = 1.0, burst: int = 10):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        self.suppressed = 0
+        # (logger, template) -> [tokens, updated_at, suppressed since the last record let through]
+        self._buckets: dict[tuple[str, Any], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        now = time.monotonic()
+        bucket = self._buckets.get((record.name, record.msg))
+        if bucket is None:
+            bucket = self._buckets[(record.name, record.msg)] = [self.burst, now, 0]
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if bucket[0] < 1:
+            bucket[2] += 1
+            self.suppressed += 1
+            return False
+        bucket[0] -= 1
+        if bucket[2]:
+            record.suppressed = bucket[2]
+            bucket[2] = 0
+        return True
+
+# Events that can happen on every audio frame go to this logger, which lets each message through
+# only a few times per second instead of once per frame
+frame_logger = logging.getLogger("voicerag.frames")
+frame_rate_limit = RateLimitFilter(rate=1.0, burst=10)
+frame_logger.addFilter(frame_rate_limit)
+
+class AsyncLogHandler(logging.Handler):
+    """Hands records to a background thread that formats and writes them, so a slow or blocked
+    stdout/stderr never stalls the event loop relaying audio.
+
+    The caller only merges the message arguments and puts the record on a bounded queue. When the
+    queue is full the record is dropped and counted rather than waited on. The writer thread
+    writes whatever has queued up in one go and flushes once per batch.
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None, max_queue: int = 10000, batch_size: int = 256):
+        super().__init__()
+        self.stream = stream or sys.stderr
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.dropped = 0
+        self._start()
+        # Threads don't survive a fork, each worker process needs its own queue and writer
+        os.register_at_fork(after_in_child=self._start)
+
+    def _start(self) -> None:
+        self._queue: queue.Queue[Optional[logging.LogRecord]] = queue.Queue(self.max_queue)
+        self._writer = threading.Thread(target=self._write, args=(self._queue,), name="log-writer", daemon=True)
+        self._writer.start()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            # Arguments may be mutated once the caller moves on, the rest of the formatting
+            # (including tracebacks) happens on the writer thread
+            record.msg = record.getMessage()
+            record.args = None
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+
+    def _write(self, records: queue.Queue) -> None:
+        done = False
+        while not done:
+            batch = [records.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(records.get_nowait())
+                except queue.Empty:
+                    break
+            lines = []
+            for record in batch:
+                if record is None:
+                    done = True
+                    continue
+                try:
+                    lines.append(self.format(record))
+                except Exception:
+                    self.handleError(record)
+            if lines:
+                try:
+                    self.stream.write("\n".join(lines) + "\n")
+                    self.stream.flush()
+                except Exception:
+                    self.handleError(batch[-1])
+
+    def close(self) -> None:
+        # Called by logging.shutdown at exit, writes out what's still queued
+        if self._writer.is_alive():
+            try:
+                self._queue.put(None, timeout=1)
+            except queue.Full:
+                pass
+            self._writer.join(timeout=5)
+        super().close()
+
+    def stats(self) -> dict[str, int]:
+        return {"queued": self._queue.qsize(), "dropped": self.dropped, "suppressed": frame_rate_limit.suppressed}
+
+def configure_logging(level: int = logging.INFO, json_format: bool = True, context: Optional[Callable[[], dict[str, Any]]] = None, max_queue: int = 10000) -> AsyncLogHandler:
+    """Routes all logging through an AsyncLogHandler on the root logger, replacing its handlers."""
+    handler = AsyncLogHandler(max_queue=max_queue)
+    handler.setFormatter(JsonFormatter() if json_format else TextFormatter())
+    if context is not None:
+        handler.addFilter(ContextFilter(context))
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+    gauge("logging_records_queued", "Log records waiting to be written", lambda: {(): handler.stats()["queued"]})
+    counter("logging_records_discarded", "Log records dropped on a full queue or suppressed by rate limits", lambda: {(("stat", k),): v for k, v in handler.stats().items() if k != "queued"})
+    return handler
@@ -0,0 +1,31 @@
+import math
+import os
+
+# Production entry point: gunicorn -c gunicorn.conf.py app:create_app
+# Every worker runs its own event loop and calls create_app, so credentials, token refreshers and
+# search/API clients are created per process after the fork.
+
+
+def available_cpus() -> int:
+    # Containers usually see all of the host's cores, honour the cgroup CPU quota when there is one
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as file:
+            quota, period = file.read().split()
+        if quota != "max":
+            return max(1, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    return len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = "aiohttp.GunicornWebWorker"
+# Every worker keeps its own metrics and a scrape of /metrics only reaches one of them, so a single
+# worker is the default. WEB_CONCURRENCY=auto runs one per available CPU, the series then carry a
+# worker label
+concurrency = os.environ.get("WEB_CONCURRENCY") or "1"
+workers = available_cpus() if concurrency == "auto" else int(concurrency)
+reuse_port = True
+# Realtime calls are long-lived, give them time to finish when a worker is stopped or recycled
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT") or 35)
+timeout = 120
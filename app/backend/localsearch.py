@@ -0,0 +1,126 @@
+import hashlib
+import json
+import logging
+import math
+import re
+import unicodedata
+from collections import Counter
+from collections.abc import Awaitable
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+logger = logging.getLogger("voicerag")
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+def faq_chunk_id(item: dict[str, Any]) -> str:
+    """Stable identifier for a knowledge base item, derived from its content."""
+    content = "\n".join([item.get("category", ""), item.get("title", ""), item.get("chunk", "")])
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:32]
+
+def _tokenize(text: str) -> list[str]:
+    # Case and accent insensitive, the knowledge base is French and queries may not carry accents
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return _TOKEN_PATTERN.findall(text)
+
+class BM25Index:
+    def __init__(self, documents: list[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        tokenized = [_tokenize(d) for d in documents]
+        lengths = np.array([len(t) for t in tokenized], dtype=np.float32)
+        self._norm = k1 * (1 - b + b * lengths / max(float(lengths.mean()) if len(lengths) else 0.0, 1.0))
+        self._size = len(documents)
+        # term -> (document indices, term frequencies), kept as arrays so scoring is vectorized per term
+        postings: dict[str, tuple[list[int], list[int]]] = {}
+        for i, tokens in enumerate(tokenized):
+            for term, tf in Counter(tokens).items():
+                docs, tfs = postings.setdefault(term, ([], []))
+                docs.append(i)
+                tfs.append(tf)
+        self._postings = {term: (np.array(docs), np.array(tfs, dtype=np.float32)) for term, (docs, tfs) in postings.items()}
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(self._size, dtype=np.float32)
+        for term in set(_tokenize(query)):
+            if term not in self._postings:
+                continue
+            docs, tfs = self._postings[term]
+            idf = math.log(1 + (self._size - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + self._norm[docs])
+        return scores
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, len(scores))
+    if k == 0:
+        return np.array([], dtype=int)
+    candidates = np.argpartition(-scores, k - 1)[:k]
+    return candidates[np.argsort(-scores[candidates])]
+
+class LocalSearchBackend:
+    """In-process knowledge base over the FAQ JSON file, a drop-in for AzureSearchBackend.
+
+    Keyword retrieval uses BM25. When an embeddings file (``.npz`` with ``ids`` and ``vectors``,
+    see save_embeddings) and a query embedder are provided, cosine top-k over the embedding matrix
+    is fused with the BM25 ranking using reciprocal rank fusion.
+    """
+
+    def __init__(self,
+        data_path: str | Path,
+        embeddings_path: Optional[str | Path] = None,
+        embedder: Optional[Callable[[str], Awaitable[list[float]]]] = None,
+        candidates: int = 50,
+        rrf_k: int = 60):
+        with open(data_path, encoding="utf-8") as file:
+            items = json.load(file)
+        self.documents = [{"chunk_id": faq_chunk_id(item), "title": item["title"], "chunk": item["chunk"]} for item in items]
+        self._by_id = {d["chunk_id"]: d for d in self.documents}
+        self._bm25 = BM25Index([f"{d['title']} {d['chunk']}" for d in self.documents])
+        self._embedder = embedder
+        self._candidates = candidates
+        self._rrf_k = rrf_k
+        self._vectors = None
+        if embeddings_path is not None and embedder is not None:
+            self._vectors = self._load_vectors(embeddings_path)
+        logger.info("Loaded %d documents for local search (vectors: %s)", len(self.documents), self._vectors is not None)
+
+    def _load_vectors(self, embeddings_path: str | Path) -> Optional[np.ndarray]:
+        stored = np.load(embeddings_path)
+        rows = {chunk_id: i for i, chunk_id in enumerate(stored["ids"].tolist())}
+        missing = [d["chunk_id"] for d in self.documents if d["chunk_id"] not in rows]
+        if missing:
+            logger.warning("Embeddings file %s is missing %d documents, using keyword search only", embeddings_path, len(missing))
+            return None
+        vectors = stored["vectors"][[rows[d["chunk_id"]] for d in self.documents]].astype(np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1)
+
+    async def search(self, query: str, top: int = 5) -> list[dict[str, str]]:
+        keyword_scores = self._bm25.scores(query)
+        keyword_ranking = _top_k(keyword_scores, self._candidates)
+        rankings = [keyword_ranking[keyword_scores[keyword_ranking] > 0]]
+        if self._vectors is not None:
+            try:
+                vector = np.asarray(await self._embedder(query), dtype=np.float32)
+                norm = np.linalg.norm(vector)
+                # A zero vector has no direction, every score would be NaN and the ranking arbitrary
+                if norm > 0:
+                    rankings.append(_top_k(self._vectors @ (vector / norm), self._candidates))
+            except Exception as e:
+                logger.warning("Query embedding failed, using keyword search only: %s", e)
+
+        fused: dict[int, float] = {}
+        for ranking in rankings:
+            for rank, i in enumerate(ranking.tolist()):
+                fused[i] = fused.get(i, 0.0) + 1.0 / (self._rrf_k + rank + 1)
+        best = sorted(fused, key=fused.get, reverse=True)[:top]
+        return [self.documents[i] for i in best]
+
+    async def get_sources(self, ids: list[str]) -> list[dict[str, str]]:
+        return [self._by_id[chunk_id] for chunk_id in ids if chunk_id in self._by_id]
+
+def save_embeddings(path: str | Path, ids: list[str], vectors: list[list[float]]) -> None:
+    np.savez(path, ids=np.array(ids), vectors=np.array(vectors, dtype=np.float32))
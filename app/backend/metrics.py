@@ -0,0 +1,119 @@
+import bisect
+import math
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from aiohttp import web
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (k + '="' + str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') + '"' for k, v in labels.items())
+    return "{" + ",".join(escaped) + "}"
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+class Histogram:
+    """Prometheus-style histogram, observations are bucketed in memory and rendered on scrape."""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last one is +Inf), sum]
+        self._series: dict[tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    @contextmanager
+    def timer(self, **labels: str) -> Iterator[None]:
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started_at, **labels)
+
+    def render(self, const_labels: Optional[dict[str, str]] = None) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in sorted(self._series.items()):
+            labels = {**(const_labels or {}), **dict(zip(self.labelnames, key))}
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': _format_value(bound)})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+class Gauge:
+    """Gauge whose value is read from a callback at scrape time."""
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], dict[tuple[tuple[str, str], ...], float]]):
+        self.name = name
+        self.documentation = documentation
+        self._read = read
+
+    def render(self, const_labels: Optional[dict[str, str]] = None) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for labels, value in self._read().items():
+            lines.append(f"{self.name}{_format_labels({**(const_labels or {}), **dict(labels)})} {_format_value(value)}")
+        return lines
+
+class Counter:
+    """Counter whose running totals are read from a callback at scrape time, rendered as name_total."""
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], dict[tuple[tuple[str, str], ...], float]]):
+        self.name = name
+        self.documentation = documentation
+        self._read = read
+
+    def render(self, const_labels: Optional[dict[str, str]] = None) -> list[str]:
+        name = self.name + "_total"
+        lines = [f"# HELP {name} {self.documentation}", f"# TYPE {name} counter"]
+        for labels, value in self._read().items():
+            lines.append(f"{name}{_format_labels({**(const_labels or {}), **dict(labels)})} {_format_value(value)}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, Histogram | Gauge | Counter] = {}
+        # Added to every series, e.g. the worker process when several serve the same port
+        self.const_labels: dict[str, str] = {}
+
+    def register(self, metric: Histogram | Gauge | Counter) -> Histogram | Gauge | Counter:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render(self.const_labels))
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+def histogram(name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS, registry: Optional[Registry] = None) -> Histogram:
+    return (registry or REGISTRY).register(Histogram(name, documentation, labelnames, buckets))
+
+def gauge(name: str, documentation: str, read: Callable[[], dict[tuple[tuple[str, str], ...], float]], registry: Optional[Registry] = None) -> Gauge:
+    return (registry or REGISTRY).register(Gauge(name, documentation, read))
+
+def counter(name: str, documentation: str, read: Callable[[], dict[tuple[tuple[str, str], ...], float]], registry: Optional[Registry] = None) -> Counter:
+    return (registry or REGISTRY).register(Counter(name, documentation, read))
+
+async def metrics_handler(_request: web.Request) -> web.Response:
+    return web.Response(body=REGISTRY.render().encode("utf-8"), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
@@ -1,13 +1,17 @@
-import re, httpx, os
-from typing import Any
+import asyncio, re, httpx, json, os, threading, time, unicodedata
+from collections import OrderedDict
+from collections.abc import Awaitable
+from typing import TYPE_CHECKING, Any, Callable, Optional
 import logging
-from azure.core.credentials import AzureKeyCredential
-from azure.identity import DefaultAzureCredential
-from azure.search.documents.aio import SearchClient
-from azure.search.documents.models import VectorizableTextQuery
+from azure.core.credentials import AzureKeyCredential, TokenCredential
+from aiohttp import web
 from dotenv import load_dotenv
-from rtmt import RTMiddleTier, Tool, ToolResult, ToolResultDirection
-logging.basicConfig(level=logging.INFO)
+from metrics import counter, gauge, histogram
+from rtmt import RTMiddleTier, Tool, ToolResult, ToolResultDirection, current_session
+from tokencache import COGNITIVE_SERVICES_SCOPE, SEARCH_SCOPE, AsyncTokenCache
+
+if TYPE_CHECKING:
+    from azure.search.documents.aio import SearchClient
 logger = logging.getLogger("toolingCall")
 
 if not os.environ.get("RUNNING_IN_PRODUCTION"):
@@ -19,6 +23,8 @@ else:
 
 AZURE_API_ENDPOINT = os.environ.get("AZURE_API_ENDPOINT")
 
+UPSTREAM_SECONDS = histogram("ragtools_upstream_seconds", "Time spent in the search backend and bookings API, excluding cache hits", ("operation",))
+
 _search_tool_schema = {
     "type": "function",
     "name": "search",
@@ -81,6 +87,28 @@ _booking_tool_schema = {
     }
 }
 
+_booking_details_tool_schema = {
+    "type": "function",
+    "name": "get_booking_details",
+    "description": "Retrieve bookings for Stu and Ms flights together with the details of each booking's flight " + \
+                   "(route, weather, context) in a single call. Prefer this over calling get_bookings and then get_flights.",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "flight": {
+                "type": "string",
+                "description": "Flight ID"
+            },
+            "name": {
+                "type": "string",
+                "description": "Name of the person"
+            }
+        },
+        "required": [],
+        "additionalProperties": False
+    }
+}
+
 _flight_tool_schema = {
     "type": "function",
     "name": "get_flights",
@@ -98,92 +126,573 @@ _flight_tool_schema = {
     }
 }
 
-async def _search_tool(
-    search_client: SearchClient, 
-    semantic_configuration: str,
-    identifier_field: str,
-    content_field: str,
-    embedding_field: str,
-    use_vector_query: bool,
-    args: Any) -> ToolResult:
-    print(f"Searching for '{args['query']}' in the knowledge base.")
-    # Hybrid + Reranking query using Azure AI Search
-    vector_queries = []
-    if use_vector_query:
-        vector_queries.append(VectorizableTextQuery(text=args['query'], k_nearest_neighbors=50, fields=embedding_field))
-    search_results = await search_client.search(
-        search_text=args['query'], 
-        query_type="semantic",
-        semantic_configuration_name=semantic_configuration,
-        top=5,
-        vector_queries=vector_queries,
-        select=", ".join([identifier_field, content_field])
-    )
-    result = ""
-    async for r in search_results:
-        result += f"[{r[identifier_field]}]: {r[content_field]}\n-----\n"
-    return ToolResult(result, ToolResultDirection.TO_SERVER)
+_PUNCTUATION_PATTERN = re.compile(r"[^\w\s]")
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+class _CacheEntry:
+    value: Any
+    expires_at: float
+    vector: Optional[Any]
+
+    def __init__(self, value: Any, expires_at: float, vector: Optional[Any] = None):
+        self.value = value
+        self.expires_at = expires_at
+        self.vector = vector
+
+class SearchResultCache:
+    """LRU cache with TTL for search tool results, keyed on the normalized query text.
+
+    When an embedder is given, a query that misses on its exact key is also compared against the
+    embeddings of cached queries, and a cosine similarity at or above similarity_threshold reuses
+    that entry, so rephrasings of the same FAQ question don't go back to Azure AI Search.
+    """
+
+    def __init__(self,
+        max_entries: int = 256,
+        ttl: float = 300,
+        embedder: Optional[Callable[[str], Awaitable[list[float]]]] = None,
+        similarity_threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._embedder = embedder
+        self._entries: OrderedDict[str, _CacheEntry] = OrderedDict()
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        query = unicodedata.normalize("NFKC", query).casefold()
+        query = _PUNCTUATION_PATTERN.sub(" ", query)
+        return _WHITESPACE_PATTERN.sub(" ", query).strip()
+
+    def stats(self) -> dict[str, int]:
+        return {"size": len(self._entries), "hits": self.hits, "similar_hits": self.similar_hits, "misses": self.misses}
+
+    async def get_or_search(self, query: str, search: Callable[[], Awaitable[Any]]) -> Any:
+        key = self.normalize(query)
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.value
+            del self._entries[key]
+
+        vector = None
+        if self._embedder is not None:
+            vector = await self._embed(key)
+            if vector is not None:
+                similar = self._find_similar(vector, now)
+                if similar is not None:
+                    self.similar_hits += 1
+                    return similar.value
+
+        self.misses += 1
+        value = await search()
+        self._entries[key] = _CacheEntry(value, time.monotonic() + self.ttl, vector)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return value
+
+    async def _embed(self, text: str) -> Optional[Any]:
+        import numpy as np
+        try:
+            vector = np.asarray(await self._embedder(text), dtype=np.float32)
+        except Exception as e:
+            logger.warning("Query embedding failed, using exact match only: %s", e)
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+
+    def _find_similar(self, vector: Any, now: float) -> Optional[_CacheEntry]:
+        best, best_score = None, self.similarity_threshold
+        for key, entry in self._entries.items():
+            if entry.vector is None or entry.expires_at <= now:
+                continue
+            score = float(entry.vector @ vector)
+            if score >= best_score:
+                best, best_score = key, score
+        if best is None:
+            return None
+        self._entries.move_to_end(best)
+        return self._entries[best]
+
+def create_query_embedder(endpoint: str, deployment: str, credentials: AzureKeyCredential | AsyncTokenCache) -> Callable[[str], Awaitable[list[float]]]:
+    from openai import AsyncAzureOpenAI
+    if isinstance(credentials, AzureKeyCredential):
+        client = AsyncAzureOpenAI(azure_endpoint=endpoint, azure_deployment=deployment, api_key=credentials.key, api_version="2023-05-15")
+    else:
+        client = AsyncAzureOpenAI(azure_endpoint=endpoint, azure_deployment=deployment,
+                                  azure_ad_token_provider=credentials.bearer_token_provider(COGNITIVE_SERVICES_SCOPE),
+                                  api_version="2023-05-15")
+
+    async def embed(text: str) -> list[float]:
+        response = await client.embeddings.create(input=text, model=deployment)
+        return response.data[0].embedding
+    return embed
+
+class AzureSearchBackend:
+    """Knowledge base backed by an Azure AI Search index (hybrid + semantic reranking)."""
+
+    def __init__(self,
+        search_endpoint: str,
+        search_index: str,
+        credentials: AzureKeyCredential | AsyncTokenCache,
+        semantic_configuration: str,
+        identifier_field: str,
+        content_field: str,
+        embedding_field: str,
+        title_field: str,
+        use_vector_query: bool):
+        self.search_endpoint = search_endpoint
+        self.search_index = search_index
+        self.credentials = credentials
+        self.semantic_configuration = semantic_configuration
+        self.identifier_field = identifier_field
+        self.content_field = content_field
+        self.embedding_field = embedding_field
+        self.title_field = title_field
+        self.use_vector_query = use_vector_query
+        self._search_client: Optional[SearchClient] = None
+        self._lock = threading.Lock()
+        self._warm_up: Optional[asyncio.Task] = None
+
+    @property
+    def search_client(self) -> "SearchClient":
+        # The search SDK takes a while to import, it's loaded by warm_up or on first use rather than at startup
+        with self._lock:
+            if self._search_client is None:
+                from azure.search.documents.aio import SearchClient
+                self._search_client = SearchClient(self.search_endpoint, self.search_index, self.credentials, user_agent="RTMiddleTier")
+        return self._search_client
+
+    def warm_up(self) -> None:
+        """Import the search SDK and create the client in a worker thread, without waiting for it."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._warm_up = asyncio.create_task(asyncio.to_thread(lambda: self.search_client))
+
+    async def search(self, query: str, top: int = 5) -> list[dict[str, str]]:
+        from azure.search.documents.models import VectorizableTextQuery
+        # Hybrid + Reranking query using Azure AI Search
+        vector_queries = []
+        if self.use_vector_query:
+            vector_queries.append(VectorizableTextQuery(text=query, k_nearest_neighbors=50, fields=self.embedding_field))
+        search_results = await self.search_client.search(
+            search_text=query, 
+            query_type="semantic",
+            semantic_configuration_name=self.semantic_configuration,
+            top=top,
+            vector_queries=vector_queries,
+            select=", ".join([self.identifier_field, self.title_field, self.content_field])
+        )
+        return [{"chunk_id": r[self.identifier_field], "title": r.get(self.title_field) or "", "chunk": r[self.content_field]} async for r in search_results]
+
+    async def get_sources(self, ids: list[str]) -> list[dict[str, str]]:
+        # Use search instead of filter to align with how detailt integrated vectorization indexes
+        # are generated, where chunk_id is searchable with a keyword tokenizer, not filterable 
+        search_results = await self.search_client.search(search_text=" OR ".join(ids), 
+                                                         search_fields=[self.identifier_field], 
+                                                         select=[self.identifier_field, self.title_field, self.content_field], 
+                                                         top=len(ids), 
+                                                         query_type="full")
+        
+        # If your index has a key field that's filterable but not searchable and with the keyword analyzer, you can 
+        # use a filter instead (and you can remove the regex check above, just ensure you escape single quotes)
+        # search_results = await search_client.search(filter=f"search.in(chunk_id, '{list}')", select=["chunk_id", "title", "chunk"])
+        return [{"chunk_id": r[self.identifier_field], "title": r[self.title_field], "chunk": r[self.content_field]} async for r in search_results]
+
+# Fields of each API result the model gets to see, as dotted paths into the response. Contact
+# details and loyalty ids are left out, callers give those to the assistant, not the other way around
+DEFAULT_RESULT_FIELDS = {
+    "get_bookings": ["bookings.id", "bookings.name", "bookings.flight", "bookings.brand", "bookings.cost",
+                     "bookings.currency", "bookings.options", "bookings.status"],
+    "get_booking_details": ["bookings.id", "bookings.name", "bookings.flight", "bookings.brand", "bookings.cost",
+                            "bookings.currency", "bookings.options", "bookings.status", "bookings.flight_details.departure",
+                            "bookings.flight_details.destination", "bookings.flight_details.weather",
+                            "bookings.flight_details.context"],
+    "get_flights": ["flights.id", "flights.departure", "flights.destination", "flights.brand", "flights.weather",
+                    "flights.context"],
+}
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for the English and French text this app handles, good enough for budgeting
+    return (len(text) + 3) // 4
+
+def _project(value: Any, fields: dict[str, Any]) -> Any:
+    if isinstance(value, list):
+        return [_project(v, fields) for v in value]
+    if not isinstance(value, dict):
+        return value
+    return {k: _project(value[k], sub) if sub else value[k] for k, sub in fields.items() if k in value}
+
+def _field_tree(paths: list[str]) -> dict[str, Any]:
+    # "a.b" and "a.c" -> {"a": {"b": {}, "c": {}}}, an empty dict keeps the whole value
+    tree: dict[str, Any] = {}
+    for path in paths:
+        node = tree
+        *parents, leaf = path.split(".")
+        for part in parents:
+            if node.get(part) == {}:
+                break
+            node = node.setdefault(part, {})
+        else:
+            node[leaf] = {}
+    return tree
+
+def _truncate(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    if (space := cut.rfind(" ")) > max_chars // 2:
+        cut = cut[:space]
+    return cut.rstrip() + "…"
+
+class ToolResultShaper:
+    """Shrinks tool results before they go back to the model as function_call_output.
+
+    API results are projected to the configured fields per tool (dotted paths, lists are mapped
+    over) and serialized without whitespace. Search chunks are fitted into a token budget: short
+    chunks are kept whole and the remaining budget is split evenly between the longer ones, which
+    are cut at a word boundary. Sizes before and after are accumulated per tool for /metrics.
+    """
+
+    def __init__(self, fields: Optional[dict[str, list[str]]] = None, search_token_budget: int = 800):
+        self.fields = {tool: _field_tree(paths) for tool, paths in (DEFAULT_RESULT_FIELDS if fields is None else fields).items()}
+        self.search_token_budget = search_token_budget
+        self.totals: dict[str, dict[str, int]] = {}
+
+    def stats(self) -> dict[tuple[tuple[str, str], ...], float]:
+        return {(("tool", tool), ("stat", stat)): value for tool, totals in self.totals.items() for stat, value in totals.items()}
+
+    def _record(self, tool: str, raw: str, sent: str) -> None:
+        totals = self.totals.setdefault(tool, {"calls": 0, "raw_bytes": 0, "sent_bytes": 0, "raw_tokens": 0, "sent_tokens": 0})
+        totals["calls"] += 1
+        totals["raw_bytes"] += len(raw.encode("utf-8"))
+        totals["sent_bytes"] += len(sent.encode("utf-8"))
+        totals["raw_tokens"] += estimate_tokens(raw)
+        totals["sent_tokens"] += estimate_tokens(sent)
+
+    def shape(self, tool: str, result: Any) -> str:
+        raw = json.dumps(result)
+        if tool in self.fields:
+            result = _project(result, self.fields[tool])
+        sent = json.dumps(result, ensure_ascii=False, separators=(",", ":"))
+        self._record(tool, raw, sent)
+        return sent
+
+    def fit_chunks(self, docs: list[dict[str, str]]) -> list[str]:
+        chunks = [d["chunk"] for d in docs]
+        if self.search_token_budget > 0:
+            budget = self.search_token_budget * 4
+            order = sorted(range(len(chunks)), key=lambda i: len(chunks[i]))
+            for n, i in enumerate(order):
+                share = budget // (len(order) - n)
+                chunks[i] = _truncate(chunks[i], share)
+                budget -= len(chunks[i])
+        return chunks
+
+    def shape_search(self, docs: list[dict[str, str]]) -> str:
+        raw = "".join(f"[{d['chunk_id']}]: {d['chunk']}\n-----\n" for d in docs)
+        sent = "".join(f"[{d['chunk_id']}]: {chunk}\n-----\n" for d, chunk in zip(docs, self.fit_chunks(docs)))
+        self._record("search", raw, sent)
+        return sent
+
+class ChunkStore:
+    """Chunks returned by the search tool, by chunk id, bounded to the most recent max_entries."""
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._chunks: OrderedDict[str, dict[str, str]] = OrderedDict()
+
+    def add(self, docs: list[dict[str, str]]) -> None:
+        for doc in docs:
+            self._chunks[doc["chunk_id"]] = doc
+            self._chunks.move_to_end(doc["chunk_id"])
+        while len(self._chunks) > self.max_entries:
+            self._chunks.popitem(last=False)
+
+    def get(self, chunk_id: str) -> Optional[dict[str, str]]:
+        return self._chunks.get(chunk_id)
+
+def _session_chunks() -> Optional[ChunkStore]:
+    session = current_session.get()
+    if session is None:
+        return None
+    return session.state.setdefault("chunks", ChunkStore())
+
+async def _search_tool(search_backend: Any, search_cache: Optional[SearchResultCache], shaper: ToolResultShaper, args: Any) -> ToolResult:
+    return _search_result(shaper, await _search_docs(search_backend, search_cache, args))
+
+async def _search_docs(search_backend: Any, search_cache: Optional[SearchResultCache], args: Any) -> list[dict[str, str]]:
+    if search_cache is not None:
+        return await search_cache.get_or_search(args['query'], lambda: _search(search_backend, args))
+    return await _search(search_backend, args)
+
+def _search_result(shaper: ToolResultShaper, docs: list[dict[str, str]]) -> ToolResult:
+    # Remember what the model was shown, report_grounding cites these ids a moment later
+    if (chunks := _session_chunks()) is not None:
+        chunks.add(docs)
+    return ToolResult(shaper.shape_search(docs), ToolResultDirection.TO_SERVER)
+
+async def _search(search_backend: Any, args: Any) -> list[dict[str, str]]:
+    logger.info("Searching for '%s' in the knowledge base", args['query'], extra={"tool": "search"})
+    with UPSTREAM_SECONDS.timer(operation="search"):
+        return await search_backend.search(args['query'], top=5)
 
 KEY_PATTERN = re.compile(r'^[a-zA-Z0-9_=\-]+$')
 
-# TODO: move from sending all chunks used for grounding eagerly to only sending links to 
-# the original content in storage, it'll be more efficient overall
-async def _report_grounding_tool(search_client: SearchClient, identifier_field: str, title_field: str, content_field: str, args: Any) -> None:
-    sources = [s for s in args["sources"] if KEY_PATTERN.match(s)]
-    list = " OR ".join(sources)
-    print(f"Grounding source: {list}")
-    # Use search instead of filter to align with how detailt integrated vectorization indexes
-    # are generated, where chunk_id is searchable with a keyword tokenizer, not filterable 
-    search_results = await search_client.search(search_text=list, 
-                                                search_fields=[identifier_field], 
-                                                select=[identifier_field, title_field, content_field], 
-                                                top=len(sources), 
-                                                query_type="full")
-    
-    # If your index has a key field that's filterable but not searchable and with the keyword analyzer, you can 
-    # use a filter instead (and you can remove the regex check above, just ensure you escape single quotes)
-    # search_results = await search_client.search(filter=f"search.in(chunk_id, '{list}')", select=["chunk_id", "title", "chunk"])
+async def _get_sources(search_backend: Any, sources: list[str]) -> list[dict[str, str]]:
+    # Sources the model cites come from this session's searches, only ids we never returned
+    # (e.g. from an earlier session's context) need a lookup in the search backend
+    chunks = _session_chunks()
+    found = {}
+    if chunks is not None:
+        found = {chunk_id: doc for chunk_id in sources if (doc := chunks.get(chunk_id)) is not None}
+    missing = [chunk_id for chunk_id in sources if chunk_id not in found]
+    if missing:
+        with UPSTREAM_SECONDS.timer(operation="grounding"):
+            for doc in await search_backend.get_sources(missing):
+                found[doc["chunk_id"]] = doc
+    return [found[chunk_id] for chunk_id in sources if chunk_id in found]
 
-    docs = []
-    async for r in search_results:
-        docs.append({"chunk_id": r[identifier_field], "title": r[title_field], "chunk": r[content_field]})
+async def _report_grounding_tool(search_backend: Any, references_only: bool, args: Any) -> None:
+    sources = [s for s in args["sources"] if KEY_PATTERN.match(s)]
+    logger.info("Grounding source: %s", " OR ".join(sources), extra={"tool": "report_grounding"})
+    docs = await _get_sources(search_backend, list(dict.fromkeys(sources))) if sources else []
+    if references_only:
+        # The client fetches the full text from /chunks/{chunk_id} when a source is opened
+        docs = [{"chunk_id": d["chunk_id"], "title": d["title"]} for d in docs]
     return ToolResult({"sources": docs}, ToolResultDirection.TO_CLIENT)
 
-async def _booking_tool(args: Any) -> ToolResult:
-    print(f"Retrieving bookings for flight '{args.get('flight')}' and name '{args.get('name')}'.")
-    async with httpx.AsyncClient() as client:
-        response = await client.get(AZURE_API_ENDPOINT+"/api/bookings", params=args)
-        response.raise_for_status()
-        bookings = response.json()
-    return ToolResult({"bookings": bookings}, ToolResultDirection.TO_SERVER)
+def _create_chunks_handler(search_backend: Any, max_entries: int = 1024) -> Callable[[web.Request], Awaitable[web.Response]]:
+    cache = ChunkStore(max_entries)
 
-async def _flight_tool(args: Any) -> ToolResult:
-    print(f"Retrieving flights for flight '{args.get('flight')}'.")
-    async with httpx.AsyncClient() as client:
-        response = await client.get(AZURE_API_ENDPOINT+"/api/flights", params=args)
+    async def chunks_handler(request: web.Request) -> web.Response:
+        chunk_id = request.match_info["chunk_id"]
+        if not KEY_PATTERN.match(chunk_id):
+            raise web.HTTPNotFound()
+        doc = cache.get(chunk_id)
+        if doc is None:
+            with UPSTREAM_SECONDS.timer(operation="chunk"):
+                docs = await search_backend.get_sources([chunk_id])
+            doc = next((d for d in docs if d["chunk_id"] == chunk_id), None)
+            if doc is None:
+                raise web.HTTPNotFound()
+            cache.add([doc])
+        # Chunks only change when the index is rebuilt, let the browser keep them for a while
+        return web.json_response(doc, headers={"Cache-Control": "public, max-age=300"})
+    return chunks_handler
+
+_MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
+
+class _ApiCacheEntry:
+    etag: Optional[str]
+    value: Any
+    fresh_until: float
+
+    def __init__(self, etag: Optional[str], value: Any, fresh_until: float):
+        self.etag = etag
+        self.value = value
+        self.fresh_until = fresh_until
+
+class ApiResponseCache:
+    """HTTP caching for the bookings API client, shared by every session in the process.
+
+    Responses are reused without a request while the API's Cache-Control max-age holds, then
+    revalidated with If-None-Match so an unchanged result costs a 304 with no body. Responses
+    marked no-store are never kept.
+
+    Identical requests in flight at the same time share a single upstream call. For max_stale
+    seconds past expiry, the cached value is returned immediately and refreshed in the background,
+    so a burst of callers asking about the same flight costs one API call and no waiting.
+    """
+
+    def __init__(self, max_entries: int = 512, max_stale: float = 60):
+        self.max_entries = max_entries
+        self.max_stale = max_stale
+        self.fresh_hits = 0
+        self.stale_hits = 0
+        self.coalesced = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._entries: OrderedDict[tuple, _ApiCacheEntry] = OrderedDict()
+        self._inflight: dict[tuple, asyncio.Task] = {}
+
+    def stats(self) -> dict[str, int]:
+        return {"size": len(self._entries), "fresh_hits": self.fresh_hits, "stale_hits": self.stale_hits,
+                "coalesced": self.coalesced, "revalidated": self.revalidated, "misses": self.misses}
+
+    async def get_json(self, api_client: httpx.AsyncClient, operation: str, url: str, params: dict[str, Any]) -> Any:
+        key = (url, tuple(sorted((k, str(v)) for k, v in params.items())))
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None and entry.fresh_until > now:
+            self._entries.move_to_end(key)
+            self.fresh_hits += 1
+            return entry.value
+        if entry is not None and entry.fresh_until + self.max_stale > now:
+            self.stale_hits += 1
+            self._fetch(key, api_client, operation, url, params)
+            return entry.value
+        if key in self._inflight:
+            self.coalesced += 1
+        # Shielded so a caller that gets cancelled doesn't cancel the request for everyone else
+        return await asyncio.shield(self._fetch(key, api_client, operation, url, params))
+
+    def _fetch(self, key: tuple, api_client: httpx.AsyncClient, operation: str, url: str, params: dict[str, Any]) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.create_task(self._request(key, api_client, operation, url, params))
+            task.add_done_callback(lambda t: self._fetched(key, t))
+        return task
+
+    def _fetched(self, key: tuple, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Background refreshes have no waiter, their failures only show up here
+        if not task.cancelled() and (e := task.exception()) is not None:
+            logger.warning("Bookings API request %s failed: %s", key[0], e)
+
+    async def _request(self, key: tuple, api_client: httpx.AsyncClient, operation: str, url: str, params: dict[str, Any]) -> Any:
+        entry = self._entries.get(key)
+        headers = {"If-None-Match": entry.etag} if entry is not None and entry.etag else {}
+        with UPSTREAM_SECONDS.timer(operation=operation):
+            response = await api_client.get(url, params=params, headers=headers)
+        cache_control = response.headers.get("cache-control", "")
+        max_age = int(m.group(1)) if (m := _MAX_AGE_PATTERN.search(cache_control)) else 0
+        if response.status_code == 304 and entry is not None:
+            self.revalidated += 1
+            entry.fresh_until = time.monotonic() + max_age
+            # The entry may have been evicted while the request was in flight
+            self._store(key, entry)
+            return entry.value
         response.raise_for_status()
-        flights = response.json()
-    return ToolResult({"flights": flights}, ToolResultDirection.TO_SERVER)
+        self.misses += 1
+        value = response.json()
+        if "no-store" in cache_control:
+            self._entries.pop(key, None)
+        elif response.headers.get("etag") or max_age > 0:
+            self._store(key, _ApiCacheEntry(response.headers.get("etag"), value, time.monotonic() + max_age))
+        return value
+
+    def _store(self, key: tuple, entry: _ApiCacheEntry) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+async def _get_json(api_client: httpx.AsyncClient, api_cache: Optional[ApiResponseCache], operation: str, url: str, params: dict[str, Any]) -> Any:
+    if api_cache is not None:
+        return await api_cache.get_json(api_client, operation, url, params)
+    with UPSTREAM_SECONDS.timer(operation=operation):
+        response = await api_client.get(url, params=params)
+    response.raise_for_status()
+    return response.json()
+
+async def _booking_tool(api_client: httpx.AsyncClient, api_cache: Optional[ApiResponseCache], shaper: ToolResultShaper, args: Any) -> ToolResult:
+    logger.info("Retrieving bookings for flight '%s' and name '%s'", args.get('flight'), args.get('name'), extra={"tool": "get_bookings"})
+    bookings = await _get_json(api_client, api_cache, "bookings", "/api/bookings", args)
+    return ToolResult(shaper.shape("get_bookings", bookings), ToolResultDirection.TO_SERVER)
+
+async def _flight_tool(api_client: httpx.AsyncClient, api_cache: Optional[ApiResponseCache], shaper: ToolResultShaper, args: Any) -> ToolResult:
+    logger.info("Retrieving flights for flight '%s'", args.get('flight'), extra={"tool": "get_flights"})
+    flights = await _get_json(api_client, api_cache, "flights", "/api/flights", args)
+    return ToolResult(shaper.shape("get_flights", flights), ToolResultDirection.TO_SERVER)
+
+async def _booking_details_tool(api_client: httpx.AsyncClient, shaper: ToolResultShaper, args: Any) -> ToolResult:
+    logger.info("Retrieving bookings and flights for flight '%s' and name '%s'", args.get('flight'), args.get('name'), extra={"tool": "get_booking_details"})
+    # Bookings and their flights in one round-trip instead of get_bookings followed by get_flights
+    with UPSTREAM_SECONDS.timer(operation="lookup"):
+        response = await api_client.post("/api/lookup", json={"bookings": [args]})
+    response.raise_for_status()
+    bookings = response.json()["bookings"][0]
+    return ToolResult(shaper.shape("get_booking_details", {"bookings": bookings}), ToolResultDirection.TO_SERVER)
+
+def create_api_client(
+    base_url: Optional[str] = None,
+    max_connections: int = 100,
+    max_keepalive_connections: int = 20,
+    keepalive_expiry: float = 30.0,
+    timeout: float = 10.0,
+    connect_timeout: float = 3.0
+    ) -> httpx.AsyncClient:
+    """Create the long-lived client used by the booking and flight tools.
+
+    One client is shared by every session so calls to the bookings API reuse pooled, kept-alive
+    connections instead of paying a TCP+TLS handshake in the middle of a spoken turn. The caller
+    owns the client and must close it (``await client.aclose()``) on shutdown.
+    """
+    try:
+        import h2  # noqa: F401
+        http2 = True
+    except ImportError:
+        http2 = False
+    limits = httpx.Limits(max_connections=max_connections,
+                          max_keepalive_connections=max_keepalive_connections,
+                          keepalive_expiry=keepalive_expiry)
+    logger.info("Creating bookings API client (max_connections=%d, keepalive=%d, http2=%s)", max_connections, max_keepalive_connections, http2)
+    return httpx.AsyncClient(base_url=base_url or AZURE_API_ENDPOINT or "",
+                             limits=limits,
+                             timeout=httpx.Timeout(timeout, connect=connect_timeout),
+                             http2=http2)
 
 def attach_rag_tools(rtmt: RTMiddleTier,
-    credentials: AzureKeyCredential | DefaultAzureCredential,
+    credentials: AzureKeyCredential | AsyncTokenCache | TokenCredential,
     search_endpoint: str, search_index: str,
     semantic_configuration: str,
     identifier_field: str,
     content_field: str,
     embedding_field: str,
     title_field: str,
-    use_vector_query: bool
-    ) -> None:
-    if not isinstance(credentials, AzureKeyCredential):
-        credentials.get_token("https://search.azure.com/.default") # warm this up before we start getting requests
-    search_client = SearchClient(search_endpoint, search_index, credentials, user_agent="RTMiddleTier")
+    use_vector_query: bool,
+    api_client: Optional[httpx.AsyncClient] = None,
+    search_cache: Optional[SearchResultCache] = None,
+    search_backend: Optional[Any] = None,
+    grounding_references_only: bool = False,
+    result_shaper: Optional[ToolResultShaper] = None,
+    api_cache: Optional[ApiResponseCache] = None
+    ) -> Callable[[web.Request], Awaitable[web.Response]]:
+    """Register the tools on rtmt. Returns the handler for GET /chunks/{chunk_id}, which serves the
+    full text of a grounding source (needed by the client when grounding_references_only is set)."""
+    if search_backend is None:
+        if not isinstance(credentials, AzureKeyCredential):
+            if not isinstance(credentials, AsyncTokenCache):
+                credentials = AsyncTokenCache(credentials)
+            credentials.prefetch(SEARCH_SCOPE) # warm this up before we start getting requests
+        search_backend = AzureSearchBackend(search_endpoint, search_index, credentials, semantic_configuration, identifier_field, content_field, embedding_field, title_field, use_vector_query)
+        search_backend.warm_up()
+    if search_cache is not None:
+        gauge("ragtools_search_cache_entries", "Search results held in the cache", lambda: {(): search_cache.stats()["size"]})
+        counter("ragtools_search_cache_lookups", "Search result cache hits, similar-query hits and misses", lambda: {(("stat", k),): v for k, v in search_cache.stats().items() if k != "size"})
+    if result_shaper is None:
+        result_shaper = ToolResultShaper()
+    counter("ragtools_tool_result_size", "Tool result calls, and bytes and estimated tokens before and after shaping", result_shaper.stats)
     logger.info("Attaching Rag tool")
-    rtmt.tools["search"] = Tool(schema=_search_tool_schema, target=lambda args: _search_tool(search_client, semantic_configuration, identifier_field, content_field, embedding_field, use_vector_query, args))
-    rtmt.tools["report_grounding"] = Tool(schema=_grounding_tool_schema, target=lambda args: _report_grounding_tool(search_client, identifier_field, title_field, content_field, args))
+    rtmt.tools["search"] = Tool(schema=_search_tool_schema, target=lambda args: _search_tool(search_backend, search_cache, result_shaper, args),
+                                speculate=lambda transcript: {"query": transcript},
+                                prefetch=lambda args: _search_docs(search_backend, search_cache, args),
+                                complete=lambda docs: _search_result(result_shaper, docs))
+    rtmt.tools["report_grounding"] = Tool(schema=_grounding_tool_schema, target=lambda args: _report_grounding_tool(search_backend, grounding_references_only, args))
     
+    if api_client is None:
+        api_client = create_api_client()
+    if api_cache is not None:
+        gauge("ragtools_api_cache_entries", "Bookings API responses held in the cache", lambda: {(): api_cache.stats()["size"]})
+        counter("ragtools_api_cache_requests", "Bookings API cache hits, coalesced requests, revalidations and misses", lambda: {(("stat", k),): v for k, v in api_cache.stats().items() if k != "size"})
+
     logger.info("Attaching booking tool")
-    rtmt.tools["get_bookings"] = Tool(schema=_booking_tool_schema, target=lambda args: _booking_tool(args))
+    rtmt.tools["get_bookings"] = Tool(schema=_booking_tool_schema, target=lambda args: _booking_tool(api_client, api_cache, result_shaper, args))
+
+    logger.info("Attaching booking details tool")
+    rtmt.tools["get_booking_details"] = Tool(schema=_booking_details_tool_schema, target=lambda args: _booking_details_tool(api_client, result_shaper, args))
 
     logger.info("Attaching flight tool")
-    rtmt.tools["get_flights"] = Tool(schema=_flight_tool_schema, target=lambda args: _flight_tool(args))
\ No newline at end of file
+    rtmt.tools["get_flights"] = Tool(schema=_flight_tool_schema, target=lambda args: _flight_tool(api_client, api_cache, result_shaper, args))
+
+    return _create_chunks_handler(search_backend)
@@ -1,16 +1,79 @@
 import asyncio
+import binascii
+import contextvars
 import json
 import logging
+import re
+import time
+import uuid
+from collections import deque
 from enum import Enum
 from typing import Any, Callable, Optional
 
 import aiohttp
 from aiohttp import web
-from azure.core.credentials import AzureKeyCredential
-from azure.identity import DefaultAzureCredential, get_bearer_token_provider
+from azure.core.credentials import AzureKeyCredential, TokenCredential
+
+from asynclog import frame_logger
+from metrics import histogram
+from rtpool import RTConnectionPool
+from tokencache import COGNITIVE_SERVICES_SCOPE, AsyncTokenCache
 
 logger = logging.getLogger("voicerag")
 
+UPSTREAM_CONNECT_SECONDS = histogram("rtmt_upstream_connect_seconds", "Time to get a realtime WebSocket to Azure OpenAI, including the handshake unless a warm one was available", ("warm",))
+FIRST_AUDIO_SECONDS = histogram("rtmt_first_audio_seconds", "Time from the end of user speech (or a client response.create) to the first audio delta")
+TOOL_CALL_SECONDS = histogram("rtmt_tool_call_seconds", "Duration of server-side tool calls", ("tool", "status"))
+TOOL_FOLLOWUP_SECONDS = histogram("rtmt_tool_followup_seconds", "Time from a function call's response.output_item.done to the follow-up response.create")
+
+# Matches the event type without decoding the whole frame. Event producers put "type" first, so
+# only the head of the frame is scanned; a miss simply falls back to a full json.loads
+_TYPE_PATTERN = re.compile(r'"type"\s*:\s*"([^"\\]+)"')
+_TYPE_PEEK_LENGTH = 128
+
+def _peek_type(data: str) -> Optional[str]:
+    match = _TYPE_PATTERN.search(data, 0, _TYPE_PEEK_LENGTH)
+    return match.group(1) if match else None
+
+# Peeking is only safe for frames from the realtime service. A client frame could repeat the "type"
+# key, and the service's JSON parser keeps the last one, so a client frame is only relayed without
+# decoding when it is exactly an audio append and nothing else: the append prefix, then a string
+# with no quote or escape in it (so no further keys), then the end of the object. Two find() scans
+# cost a fraction of a json.loads, or of a regex over the base64 payload
+_CLIENT_APPEND_PREFIX = '{"type":"input_audio_buffer.append","audio":"'
+
+def _is_plain_append(data: str) -> bool:
+    start = len(_CLIENT_APPEND_PREFIX)
+    return (data.startswith(_CLIENT_APPEND_PREFIX) and data.endswith('"}')
+            and data.find('"', start) == len(data) - 2 and data.find("\\", start) == -1)
+
+# Sub-protocol a client can request on /realtime to send its microphone audio as binary frames of
+# raw PCM16 instead of input_audio_buffer.append events, and get response.audio.delta back the
+# same way. All other events stay JSON text frames.
+BINARY_AUDIO_PROTOCOL = "voicerag.binary-audio.v1"
+# Same framing for telephony gateways, binary frames carry 8 kHz G.711 that the middle tier
+# converts to and from the model's 24 kHz PCM16
+TELEPHONY_PROTOCOLS = {"voicerag.g711-ulaw.v1": "ulaw", "voicerag.g711-alaw.v1": "alaw"}
+
+_DELTA_PATTERN = re.compile(r'"delta"\s*:\s*"')
+
+def _append_event(pcm: bytes) -> str:
+    # Built directly around the encoded payload instead of json.dumps of a dict
+    return '{"type":"input_audio_buffer.append","audio":"' + binascii.b2a_base64(pcm, newline=False).decode("ascii") + '"}'
+
+def _audio_delta_pcm(data: str) -> Optional[bytes]:
+    match = _DELTA_PATTERN.search(data)
+    if match is None:
+        return None
+    # a2b_base64 skips characters outside the alphabet, so a JSON-escaped "\/" still decodes
+    return binascii.a2b_base64(data[match.end():data.index('"', match.end())])
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+def _words(args: Any) -> set[str]:
+    values = args.values() if isinstance(args, dict) else [args]
+    return {word for value in values if isinstance(value, str) for word in _WORD_PATTERN.findall(value.casefold())}
+
 class ToolResultDirection(Enum):
     TO_SERVER = 1
     TO_CLIENT = 2
@@ -31,19 +94,169 @@ class ToolResult:
 class Tool:
     target: Callable[..., ToolResult]
     schema: Any
+    # Optional speculative execution: speculate maps the user's transcribed utterance to arguments,
+    # prefetch runs the tool's lookup for them ahead of the model's call, and complete turns what
+    # prefetch returned into the tool result, only once a call of the model actually uses it
+    speculate: Optional[Callable[[str], Any]] = None
+    prefetch: Optional[Callable[[Any], Any]] = None
+    complete: Optional[Callable[[Any], ToolResult]] = None
 
-    def __init__(self, target: Any, schema: Any):
+    def __init__(self, target: Any, schema: Any,
+        speculate: Optional[Callable[[str], Any]] = None,
+        prefetch: Optional[Callable[[Any], Any]] = None,
+        complete: Optional[Callable[[Any], ToolResult]] = None):
         self.target = target
         self.schema = schema
+        self.speculate = speculate
+        self.prefetch = prefetch
+        self.complete = complete
 
 class RTToolCall:
     tool_call_id: str
     previous_id: str
+    task: Optional[asyncio.Task] = None
+    done_at: Optional[float] = None
 
     def __init__(self, tool_call_id: str, previous_id: str):
         self.tool_call_id = tool_call_id
         self.previous_id = previous_id
 
+class RTBackpressureError(Exception):
+    pass
+
+class RTRelayQueue:
+    """Bounded buffer between a socket reader and its writer, one per direction and connection.
+
+    When max_frames or max_bytes would be exceeded the policy applies: "block" stops reading the
+    source until the writer catches up, "drop" first discards the oldest frames whose type is in
+    droppable (stale audio) and otherwise blocks, and "disconnect" ends the session.
+    """
+
+    def __init__(self, max_frames: int, max_bytes: int, policy: str = "block", droppable: frozenset[str] = frozenset()):
+        self.max_frames = max_frames
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.droppable = droppable
+        self.dropped = 0
+        self._frames: deque[str] = deque()
+        self._bytes = 0
+        self._closed = False
+        self._has_data = asyncio.Event()
+        self._has_space = asyncio.Event()
+
+    def _full(self, size: int) -> bool:
+        # A single frame larger than max_bytes is still accepted into an empty queue
+        return len(self._frames) > 0 and (len(self._frames) >= self.max_frames or self._bytes + size > self.max_bytes)
+
+    async def put(self, data: str) -> None:
+        while self._full(len(data)) and not self._closed:
+            if self.policy == "drop" and self.drop(self.droppable, oldest_only=True):
+                continue
+            if self.policy == "disconnect":
+                raise RTBackpressureError(f"relay queue full ({len(self._frames)} frames, {self._bytes} bytes)")
+            self._has_space.clear()
+            await self._has_space.wait()
+        self._frames.append(data)
+        self._bytes += len(data)
+        self._has_data.set()
+
+    async def get(self) -> Optional[str]:
+        """Next frame, or None once the queue is closed and drained."""
+        while not self._frames:
+            if self._closed:
+                return None
+            self._has_data.clear()
+            await self._has_data.wait()
+        data = self._frames.popleft()
+        self._bytes -= len(data)
+        self._has_space.set()
+        return data
+
+    def drop(self, types: frozenset[str], oldest_only: bool = False) -> int:
+        dropped = 0
+        kept: deque[str] = deque()
+        while self._frames:
+            data = self._frames.popleft()
+            if (not oldest_only or dropped == 0) and _peek_type(data) in types:
+                self._bytes -= len(data)
+                dropped += 1
+            else:
+                kept.append(data)
+        self._frames = kept
+        if dropped:
+            self.dropped += dropped
+            self._has_space.set()
+        return dropped
+
+    def close(self) -> None:
+        self._closed = True
+        self._has_data.set()
+        self._has_space.set()
+
+class RTSpeculation:
+    args: Any
+    task: asyncio.Task
+
+    def __init__(self, args: Any, task: asyncio.Task):
+        self.args = args
+        self.task = task
+
+# The session whose messages are being processed, tool targets run inside it and can keep
+# per-call state in RTSession.state
+current_session: contextvars.ContextVar[Optional["RTSession"]] = contextvars.ContextVar("current_session", default=None)
+
+def session_log_context() -> dict[str, Any]:
+    # Fields added to every log record, see asynclog.configure_logging
+    session = current_session.get()
+    return {"session_id": session.id, "turn_id": session.turn_id} if session is not None else {}
+
+class RTSession:
+    """State for a single client connection, each /realtime WebSocket gets its own instance so
+    concurrent callers served by the same RTMiddleTier never see each other's tool calls."""
+    id: str
+    client_ws: web.WebSocketResponse
+    server_ws: Optional[aiohttp.ClientWebSocketResponse] = None
+    created_at: float
+    connected_at: Optional[float] = None
+    turn_id: int = 0
+    turn_started_at: Optional[float] = None
+    binary_audio: bool = False
+    codec: Optional[Any] = None
+
+    def __init__(self, client_ws: web.WebSocketResponse):
+        self.id = str(uuid.uuid4())
+        self.client_ws = client_ws
+        self.created_at = time.perf_counter()
+        self.tools_pending: dict[str, RTToolCall] = {}
+        self.tools_called: set[str] = set()
+        self.speculations: dict[str, RTSpeculation] = {}
+        self.to_client: Optional[RTRelayQueue] = None
+        self.to_server: Optional[RTRelayQueue] = None
+        self.state: dict[str, Any] = {}
+        self._tasks: set[asyncio.Task] = set()
+
+    def start_turn(self) -> None:
+        self.turn_id += 1
+        self.turn_started_at = time.perf_counter()
+        self.tools_called.clear()
+        # Speculations belong to the previous utterance, don't let this turn's calls pick them up
+        for speculation in self.speculations.values():
+            speculation.task.cancel()
+        self.speculations.clear()
+
+    def track_task(self, task: asyncio.Task) -> asyncio.Task:
+        # Keep a strong reference until done, the event loop only holds weak references to tasks
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def close(self) -> None:
+        # Tools still running when the caller hangs up have nobody to report to
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
 class RTMiddleTier:
     endpoint: str
     deployment: str
@@ -51,7 +264,7 @@ class RTMiddleTier:
     
     # Tools are server-side only for now, though the case could be made for client-side tools
     # in addition to server-side tools that are invisible to the client
-    tools: dict[str, Tool] = {}
+    tools: dict[str, Tool]
 
     # Server-enforced configuration, if set, these will override the client's configuration
     # Typically at least the model name and system message will be set by the server
@@ -62,37 +275,105 @@ class RTMiddleTier:
     disable_audio: Optional[bool] = None
     voice_choice: Optional[str] = None
     api_version: str = "2024-10-01-preview"
-    _tools_pending = {}
+
+    # Events the middle tier never rewrites, these are relayed as the original frame without being
+    # decoded. Audio deltas and appends are the bulk of the traffic (base64 PCM), so skipping the
+    # JSON round-trip for them is most of the per-session CPU. From the client, only plain
+    # input_audio_buffer.append frames take this path, see _is_plain_append
+    fast_relay: bool = True
+    passthrough_to_client: frozenset[str] = frozenset({
+        "response.audio.delta",
+        "response.audio_transcript.delta",
+        "response.text.delta",
+        "input_audio_buffer.speech_started",
+        "input_audio_buffer.speech_stopped",
+        "input_audio_buffer.committed",
+    })
+
+    # Start tools that support it (see Tool.speculate) as soon as the user's transcript arrives, and
+    # reuse that result when the model calls the tool with arguments mostly made of the same words
+    speculative_tools: bool = False
+    speculative_min_overlap: float = 0.6
+
+    # Per-direction relay buffers, see RTRelayQueue for the policies. A full queue holds up the
+    # reader by default, "drop" is opt-in and discards the droppable types of that direction. Audio
+    # still queued for the client when the user starts speaking again (barge-in) is stale and
+    # dropped regardless of the policy
+    queue_max_frames: int = 512
+    queue_max_bytes: int = 8 * 1024 * 1024
+    backpressure_policy: str = "block"
+    drop_audio_on_barge_in: bool = True
+    droppable_to_client: frozenset[str] = frozenset({"response.audio.delta"})
+    droppable_to_server: frozenset[str] = frozenset()
+
+    # Share of real time a telephony call may spend converting audio before it falls back to a
+    # cheaper resampling filter
+    telephony_max_cpu_ratio: float = 0.02
+
+    # On shutdown, live calls get this long to finish before their sockets are closed
+    drain_timeout: float = 30
+
+    # Number of pre-opened upstream sockets kept ready for new callers, and how long one may idle
+    warm_connections: int = 0
+    warm_connection_max_idle: float = 60
     _token_provider = None
+    _pool: Optional[RTConnectionPool] = None
 
-    def __init__(self, endpoint: str, deployment: str, credentials: AzureKeyCredential | DefaultAzureCredential, voice_choice: Optional[str] = None):
+    def __init__(self, endpoint: str, deployment: str, credentials: AzureKeyCredential | AsyncTokenCache | TokenCredential, voice_choice: Optional[str] = None):
         self.endpoint = endpoint
         self.deployment = deployment
         self.voice_choice = voice_choice
+        self.tools = {}
+        self._sessions: set[RTSession] = set()
         if voice_choice is not None:
             logger.info("Realtime voice choice set to %s", voice_choice)
         if isinstance(credentials, AzureKeyCredential):
             self.key = credentials.key
         else:
-            self._token_provider = get_bearer_token_provider(credentials, "https://cognitiveservices.azure.com/.default")
-            self._token_provider() # Warm up during startup so we have a token cached when the first request arrives
+            if not isinstance(credentials, AsyncTokenCache):
+                credentials = AsyncTokenCache(credentials)
+            self._token_provider = credentials.bearer_token_provider(COGNITIVE_SERVICES_SCOPE)
+            credentials.prefetch(COGNITIVE_SERVICES_SCOPE) # Warm up during startup so we have a token cached when the first request arrives
+
+    def _observe_event(self, event_type: Optional[str], session: RTSession) -> None:
+        if event_type == "response.audio.delta":
+            if session.turn_started_at is not None:
+                FIRST_AUDIO_SECONDS.observe(time.perf_counter() - session.turn_started_at)
+                session.turn_started_at = None
+        elif event_type == "input_audio_buffer.speech_stopped":
+            session.start_turn()
+        elif event_type == "input_audio_buffer.speech_started":
+            if self.drop_audio_on_barge_in and session.to_client is not None:
+                session.to_client.drop(self.droppable_to_client)
+            if session.codec is not None:
+                session.codec.reset_output()
 
-    async def _process_message_to_client(self, msg: str, client_ws: web.WebSocketResponse, server_ws: web.WebSocketResponse) -> Optional[str]:
+    async def _process_message_to_client(self, msg: str, session: RTSession) -> Optional[str]:
+        if self.fast_relay:
+            event_type = _peek_type(msg.data)
+            if event_type in self.passthrough_to_client:
+                self._observe_event(event_type, session)
+                return msg.data
         message = json.loads(msg.data)
         updated_message = msg.data
         if message is not None:
+            self._observe_event(message["type"], session)
             match message["type"]:
                 case "session.created":
-                    session = message["session"]
+                    session_config = message["session"]
                     # Hide the instructions, tools and max tokens from clients, if we ever allow client-side 
                     # tools, this will need updating
-                    session["instructions"] = ""
-                    session["tools"] = []
-                    session["voice"] = self.voice_choice
-                    session["tool_choice"] = "none"
-                    session["max_response_output_tokens"] = None
+                    session_config["instructions"] = ""
+                    session_config["tools"] = []
+                    session_config["voice"] = self.voice_choice
+                    session_config["tool_choice"] = "none"
+                    session_config["max_response_output_tokens"] = None
                     updated_message = json.dumps(message)
 
+                case "conversation.item.input_audio_transcription.completed":
+                    if self.speculative_tools and message.get("transcript"):
+                        self._speculate(message["transcript"], session)
+
                 case "response.output_item.added":
                     if "item" in message and message["item"]["type"] == "function_call":
                         updated_message = None
@@ -100,8 +381,8 @@ class RTMiddleTier:
                 case "conversation.item.created":
                     if "item" in message and message["item"]["type"] == "function_call":
                         item = message["item"]
-                        if item["call_id"] not in self._tools_pending:
-                            self._tools_pending[item["call_id"]] = RTToolCall(item["call_id"], message["previous_item_id"])
+                        if item["call_id"] not in session.tools_pending:
+                            session.tools_pending[item["call_id"]] = RTToolCall(item["call_id"], message["previous_item_id"])
                         updated_message = None
                     elif "item" in message and message["item"]["type"] == "function_call_output":
                         updated_message = None
@@ -115,114 +396,264 @@ class RTMiddleTier:
                 case "response.output_item.done":
                     if "item" in message and message["item"]["type"] == "function_call":
                         item = message["item"]
-                        tool_call = self._tools_pending[message["item"]["call_id"]]
-                        tool = self.tools[item["name"]]
-                        args = item["arguments"]
-                        result = await tool.target(json.loads(args))
-                        await server_ws.send_json({
-                            "type": "conversation.item.create",
-                            "item": {
-                                "type": "function_call_output",
-                                "call_id": item["call_id"],
-                                "output": result.to_text() if result.destination == ToolResultDirection.TO_SERVER else ""
-                            }
-                        })
-                        if result.destination == ToolResultDirection.TO_CLIENT:
-                            # TODO: this will break clients that don't know about this extra message, rewrite 
-                            # this to be a regular text message with a special marker of some sort
-                            await client_ws.send_json({
-                                "type": "extension.middle_tier_tool_response",
-                                "previous_item_id": tool_call.previous_id,
-                                "tool_name": item["name"],
-                                "tool_result": result.to_text()
-                            })
+                        tool_call = session.tools_pending[message["item"]["call_id"]]
+                        tool_call.done_at = time.perf_counter()
+                        session.tools_called.add(item["name"])
+                        # Run the tool in the background so other calls from the same response overlap
+                        # and audio deltas keep flowing to the client while it executes
+                        tool_call.task = session.track_task(asyncio.create_task(self._run_tool(item, tool_call, session)))
                         updated_message = None
 
                 case "response.done":
-                    if len(self._tools_pending) > 0:
-                        self._tools_pending.clear() # Any chance tool calls could be interleaved across different outstanding responses?
-                        await server_ws.send_json({
-                            "type": "response.create"
-                        })
+                    if len(session.tools_pending) > 0:
+                        tool_calls = list(session.tools_pending.values())
+                        session.tools_pending.clear() # Any chance tool calls could be interleaved across different outstanding responses?
+                        session.track_task(asyncio.create_task(self._create_response_after(tool_calls, session)))
                     if "response" in message:
-                        replace = False
-                        for i, output in enumerate(reversed(message["response"]["output"])):
-                            if output["type"] == "function_call":
-                                message["response"]["output"].pop(i)
-                                replace = True
-                        if replace:
-                            updated_message = json.dumps(message)                        
+                        outputs = message["response"]["output"]
+                        visible = [output for output in outputs if output["type"] != "function_call"]
+                        if len(visible) != len(outputs):
+                            message["response"]["output"] = visible
+                            updated_message = json.dumps(message)
 
         return updated_message
 
-    async def _process_message_to_server(self, msg: str, ws: web.WebSocketResponse) -> Optional[str]:
+    def _speculate(self, transcript: str, session: RTSession) -> None:
+        for name, tool in self.tools.items():
+            # Too late if the model already called the tool for this turn
+            if tool.speculate is None or tool.prefetch is None or tool.complete is None or name in session.tools_called:
+                continue
+            args = tool.speculate(transcript)
+            if args is not None:
+                session.speculations[name] = RTSpeculation(args, session.track_task(asyncio.create_task(tool.prefetch(args))))
+
+    async def _speculative_result(self, name: str, args: Any, session: RTSession) -> Optional[ToolResult]:
+        speculation = session.speculations.pop(name, None)
+        if speculation is None:
+            return None
+        words = _words(args)
+        if not words or len(words & _words(speculation.args)) / len(words) < self.speculative_min_overlap:
+            return None
+        try:
+            prefetched = await speculation.task
+        except Exception:
+            return None
+        return self.tools[name].complete(prefetched)
+
+    async def _run_tool(self, item: dict, tool_call: RTToolCall, session: RTSession) -> None:
+        tool = self.tools[item["name"]]
+        started_at = time.perf_counter()
+        try:
+            args = json.loads(item["arguments"])
+            result = await self._speculative_result(item["name"], args, session)
+            status = "speculative"
+            if result is None:
+                result = await tool.target(args)
+                status = "ok"
+            TOOL_CALL_SECONDS.observe(time.perf_counter() - started_at, tool=item["name"], status=status)
+        except Exception as e:
+            TOOL_CALL_SECONDS.observe(time.perf_counter() - started_at, tool=item["name"], status="error")
+            logger.exception("Tool '%s' failed for call %s", item["name"], item["call_id"])
+            result = ToolResult({"error": str(e)}, ToolResultDirection.TO_SERVER)
+        # Through the relay queues like every other frame, so these are bounded and stay in order
+        await session.to_server.put(json.dumps({
+            "type": "conversation.item.create",
+            "item": {
+                "type": "function_call_output",
+                "call_id": item["call_id"],
+                "output": result.to_text() if result.destination == ToolResultDirection.TO_SERVER else ""
+            }
+        }))
+        if result.destination == ToolResultDirection.TO_CLIENT:
+            # TODO: this will break clients that don't know about this extra message, rewrite 
+            # this to be a regular text message with a special marker of some sort
+            await session.to_client.put(json.dumps({
+                "type": "extension.middle_tier_tool_response",
+                "previous_item_id": tool_call.previous_id,
+                "tool_name": item["name"],
+                "tool_result": result.to_text()
+            }))
+
+    async def _create_response_after(self, tool_calls: list[RTToolCall], session: RTSession) -> None:
+        # Only ask for the follow-up response once every tool output of the turn has been posted
+        await asyncio.gather(*[tool_call.task for tool_call in tool_calls if tool_call.task is not None], return_exceptions=True)
+        if not session.server_ws.closed:
+            await session.to_server.put(json.dumps({
+                "type": "response.create"
+            }))
+            done_at = [tool_call.done_at for tool_call in tool_calls if tool_call.done_at is not None]
+            if done_at:
+                TOOL_FOLLOWUP_SECONDS.observe(time.perf_counter() - min(done_at))
+
+    async def _process_message_to_server(self, msg: str, session: RTSession) -> Optional[str]:
+        if self.fast_relay and _is_plain_append(msg.data):
+            return msg.data
         message = json.loads(msg.data)
         updated_message = msg.data
         if message is not None:
             match message["type"]:
+                case "response.create":
+                    session.start_turn()
+
                 case "session.update":
-                    session = message["session"]
+                    session_config = message["session"]
                     if self.system_message is not None:
-                        session["instructions"] = self.system_message
+                        session_config["instructions"] = self.system_message
                     if self.temperature is not None:
-                        session["temperature"] = self.temperature
+                        session_config["temperature"] = self.temperature
                     if self.max_tokens is not None:
-                        session["max_response_output_tokens"] = self.max_tokens
+                        session_config["max_response_output_tokens"] = self.max_tokens
                     if self.disable_audio is not None:
-                        session["disable_audio"] = self.disable_audio
+                        session_config["disable_audio"] = self.disable_audio
                     if self.voice_choice is not None:
-                        session["voice"] = self.voice_choice
-                    session["tool_choice"] = "auto" if len(self.tools) > 0 else "none"
-                    session["tools"] = [tool.schema for tool in self.tools.values()]
+                        session_config["voice"] = self.voice_choice
+                    session_config["tool_choice"] = "auto" if len(self.tools) > 0 else "none"
+                    session_config["tools"] = [tool.schema for tool in self.tools.values()]
                     updated_message = json.dumps(message)
 
         return updated_message
 
-    async def _forward_messages(self, ws: web.WebSocketResponse):
-        async with aiohttp.ClientSession(base_url=self.endpoint) as session:
-            params = { "api-version": self.api_version, "deployment": self.deployment}
-            headers = {}
-            if "x-ms-client-request-id" in ws.headers:
-                headers["x-ms-client-request-id"] = ws.headers["x-ms-client-request-id"]
-            if self.key is not None:
-                headers = { "api-key": self.key }
+    async def _connect_upstream(self, http_session: aiohttp.ClientSession, headers: dict[str, str]) -> aiohttp.ClientWebSocketResponse:
+        params = { "api-version": self.api_version, "deployment": self.deployment}
+        headers = dict(headers)
+        if self.key is not None:
+            headers["api-key"] = self.key
+        else:
+            headers["Authorization"] = f"Bearer {await self._token_provider()}"
+        return await http_session.ws_connect("/openai/realtime", headers=headers, params=params)
+
+    @property
+    def pool(self) -> RTConnectionPool:
+        if self._pool is None:
+            self._pool = RTConnectionPool(self.endpoint, self._connect_upstream, size=self.warm_connections, max_idle=self.warm_connection_max_idle)
+        return self._pool
+
+    async def _forward_messages(self, session: RTSession):
+        ws = session.client_ws
+        headers = {}
+        if "x-ms-client-request-id" in ws.headers:
+            headers["x-ms-client-request-id"] = ws.headers["x-ms-client-request-id"]
+        connect_started_at = time.perf_counter()
+        upstream = await self.pool.acquire(headers)
+        target_ws = upstream.ws
+        session.server_ws = target_ws
+        session.connected_at = time.perf_counter()
+        UPSTREAM_CONNECT_SECONDS.observe(session.connected_at - connect_started_at, warm=str(upstream.warm).lower())
+        session.to_client = RTRelayQueue(self.queue_max_frames, self.queue_max_bytes, self.backpressure_policy, self.droppable_to_client)
+        session.to_server = RTRelayQueue(self.queue_max_frames, self.queue_max_bytes, self.backpressure_policy, self.droppable_to_server)
+
+        async def from_client_to_server():
+            async for msg in ws:
+                if msg.type == aiohttp.WSMsgType.TEXT:
+                    new_msg = await self._process_message_to_server(msg, session)
+                    if new_msg is not None:
+                        await session.to_server.put(new_msg)
+                elif msg.type == aiohttp.WSMsgType.BINARY and session.binary_audio:
+                    pcm = session.codec.decode(msg.data) if session.codec is not None else msg.data
+                    await session.to_server.put(_append_event(pcm))
+                else:
+                    frame_logger.warning("Unexpected message type from client: %s", msg.type)
+
+        async def relay_to_client(msg: aiohttp.WSMessage):
+            if msg.type == aiohttp.WSMsgType.TEXT:
+                new_msg = await self._process_message_to_client(msg, session)
+                if new_msg is not None:
+                    await session.to_client.put(new_msg)
             else:
-                headers = { "Authorization": f"Bearer {self._token_provider()}" } # NOTE: no async version of token provider, maybe refresh token on a timer?
-            async with session.ws_connect("/openai/realtime", headers=headers, params=params) as target_ws:
-                async def from_client_to_server():
-                    async for msg in ws:
-                        if msg.type == aiohttp.WSMsgType.TEXT:
-                            new_msg = await self._process_message_to_server(msg, ws)
-                            if new_msg is not None:
-                                await target_ws.send_str(new_msg)
-                        else:
-                            print("Error: unexpected message type:", msg.type)
-                    
-                    # Means it is gracefully closed by the client then time to close the target_ws
-                    if target_ws:
-                        print("Closing OpenAI's realtime socket connection.")
-                        await target_ws.close()
-                        
-                async def from_server_to_client():
-                    async for msg in target_ws:
-                        if msg.type == aiohttp.WSMsgType.TEXT:
-                            new_msg = await self._process_message_to_client(msg, ws, target_ws)
-                            if new_msg is not None:
-                                await ws.send_str(new_msg)
-                        else:
-                            print("Error: unexpected message type:", msg.type)
-
-                try:
-                    await asyncio.gather(from_client_to_server(), from_server_to_client())
-                except ConnectionResetError:
-                    # Ignore the errors resulting from the client disconnecting the socket
-                    pass
+                frame_logger.warning("Unexpected message type from realtime service: %s", msg.type)
+
+        async def from_server_to_client():
+            # A warm connection has already received session.created and maybe more
+            for msg in upstream.received:
+                await relay_to_client(msg)
+            async for msg in target_ws:
+                await relay_to_client(msg)
+            # Let the client writer drain what's left, then it ends the session
+            session.to_client.close()
+
+        async def write(queue: RTRelayQueue, target: web.WebSocketResponse | aiohttp.ClientWebSocketResponse):
+            while (data := await queue.get()) is not None:
+                await target.send_str(data)
+
+        async def write_to_client():
+            # Audio stays a JSON event in the queue so barge-in can still find and drop it, it's
+            # only turned into a binary frame on its way out
+            while (data := await session.to_client.get()) is not None:
+                if session.binary_audio and _peek_type(data) == "response.audio.delta" and (pcm := _audio_delta_pcm(data)) is not None:
+                    await ws.send_bytes(session.codec.encode(pcm) if session.codec is not None else pcm)
+                else:
+                    await ws.send_str(data)
+
+        client_reader = asyncio.create_task(from_client_to_server())
+        client_writer = asyncio.create_task(write_to_client())
+        tasks = {client_reader, client_writer,
+                 asyncio.create_task(from_server_to_client()), asyncio.create_task(write(session.to_server, target_ws))}
+        try:
+            # The session is over when the client goes away, when everything from upstream has been
+            # delivered, or when any direction fails; the other tasks are then cancelled right away
+            # rather than waiting on sockets nobody is reading
+            pending = tasks
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                if client_reader in done or client_writer in done or any(t.exception() is not None for t in done):
+                    break
+            for task in tasks:
+                if task.done() and task.exception() is not None:
+                    raise task.exception()
+        except ConnectionResetError:
+            # Ignore the errors resulting from the client disconnecting the socket
+            pass
+        except RTBackpressureError as e:
+            logger.warning("Closing session %s: %s", session.id, e)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if session.to_client.dropped or session.to_server.dropped:
+                logger.info("Session %s dropped %d frames to client, %d to server", session.id, session.to_client.dropped, session.to_server.dropped)
+            logger.info("Closing OpenAI's realtime socket connection")
+            await target_ws.close()
+            await ws.close()
 
     async def _websocket_handler(self, request: web.Request):
-        ws = web.WebSocketResponse()
+        ws = web.WebSocketResponse(protocols=(BINARY_AUDIO_PROTOCOL, *TELEPHONY_PROTOCOLS))
         await ws.prepare(request)
-        await self._forward_messages(ws)
+        session = RTSession(ws)
+        session.binary_audio = ws.ws_protocol == BINARY_AUDIO_PROTOCOL or ws.ws_protocol in TELEPHONY_PROTOCOLS
+        if ws.ws_protocol in TELEPHONY_PROTOCOLS:
+            # Imported here so browser-only deployments don't load numpy for the relay
+            from telephony import TelephonyCodec
+            session.codec = TelephonyCodec(TELEPHONY_PROTOCOLS[ws.ws_protocol], max_cpu_ratio=self.telephony_max_cpu_ratio)
+        self._sessions.add(session)
+        current_session.set(session)
+        try:
+            await self._forward_messages(session)
+        finally:
+            self._sessions.discard(session)
+            await session.close()
         return ws
+
+    async def drain(self) -> None:
+        """Wait up to drain_timeout for live sessions to end, then close the remaining ones."""
+        deadline = time.monotonic() + self.drain_timeout
+        if self._sessions:
+            logger.info("Draining %d realtime sessions", len(self._sessions))
+        while self._sessions and time.monotonic() < deadline:
+            await asyncio.sleep(0.5)
+        for session in list(self._sessions):
+            await session.client_ws.close(code=aiohttp.WSCloseCode.GOING_AWAY, message=b"Server shutting down")
     
     def attach_to_app(self, app, path):
         app.router.add_get(path, self._websocket_handler)
+
+        async def start_pool(_app):
+            await self.pool.start()
+
+        async def drain(_app):
+            await self.drain()
+
+        async def close_pool(_app):
+            await self.pool.close()
+        app.on_startup.append(start_pool)
+        app.on_shutdown.append(drain)
+        app.on_cleanup.append(close_pool)
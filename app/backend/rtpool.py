@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from collections.abc import Awaitable
+from typing import Callable, Optional
+
+import aiohttp
+
+logger = logging.getLogger("voicerag")
+
+class RTUpstreamConnection:
+    """An open realtime WebSocket plus the frames it received before being handed to a caller."""
+    ws: aiohttp.ClientWebSocketResponse
+    opened_at: float
+    warm: bool
+
+    def __init__(self, ws: aiohttp.ClientWebSocketResponse, warm: bool):
+        self.ws = ws
+        self.opened_at = time.monotonic()
+        self.warm = warm
+        self.received: list[aiohttp.WSMessage] = []
+        self._reader: Optional[asyncio.Task] = None
+
+    def start_reading(self) -> None:
+        # An idle socket still has to be read, otherwise session.created sits in the buffer and a
+        # close from the service goes unnoticed until the connection is handed out
+        self._reader = asyncio.create_task(self._read())
+
+    async def _read(self) -> None:
+        while True:
+            msg = await self.ws.receive()
+            if msg.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSING, aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                return
+            self.received.append(msg)
+
+    def usable(self, max_idle: float) -> bool:
+        return not self.ws.closed and (self._reader is None or not self._reader.done()) and time.monotonic() - self.opened_at < max_idle
+
+    async def detach(self) -> None:
+        if self._reader is not None:
+            self._reader.cancel()
+            await asyncio.gather(self._reader, return_exceptions=True)
+            self._reader = None
+
+    async def close(self) -> None:
+        await self.detach()
+        await self.ws.close()
+
+class RTConnectionPool:
+    """Upstream connections for RTMiddleTier.
+
+    All realtime sockets share one aiohttp ClientSession (and so its connector and DNS cache)
+    instead of creating one per caller. With size > 0, that many sockets are kept open and
+    authenticated ahead of time and handed to new callers, so DNS, TLS and the WebSocket upgrade
+    don't land on the caller's first utterance. Idle sockets older than max_idle seconds are
+    closed and replaced.
+    """
+
+    def __init__(self,
+        base_url: str,
+        connect: Callable[[aiohttp.ClientSession, dict[str, str]], Awaitable[aiohttp.ClientWebSocketResponse]],
+        size: int = 0,
+        max_idle: float = 60):
+        self.base_url = base_url
+        self.size = size
+        self.max_idle = max_idle
+        self._connect = connect
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._idle: deque[RTUpstreamConnection] = deque()
+        self._opening = 0
+        self._opening_tasks: set[asyncio.Task] = set()
+        self._maintainer: Optional[asyncio.Task] = None
+        self._closed = False
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            # Every realtime call holds a connection for its whole duration, don't cap them
+            connector = aiohttp.TCPConnector(limit=0, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(base_url=self.base_url, connector=connector)
+        return self._session
+
+    async def start(self) -> None:
+        if self.size > 0 and self._maintainer is None:
+            self._maintainer = asyncio.create_task(self._maintain())
+
+    async def acquire(self, headers: Optional[dict[str, str]] = None) -> RTUpstreamConnection:
+        while self._idle:
+            connection = self._idle.popleft()
+            if connection.usable(self.max_idle):
+                await connection.detach()
+                self._replenish()
+                return connection
+            await connection.close()
+        self._replenish()
+        return RTUpstreamConnection(await self._connect(self.session, headers or {}), warm=False)
+
+    def _replenish(self) -> None:
+        if self._closed:
+            return
+        for _ in range(self.size - len(self._idle) - self._opening):
+            self._opening += 1
+            task = asyncio.create_task(self._open_warm())
+            self._opening_tasks.add(task)
+            task.add_done_callback(self._opening_tasks.discard)
+
+    async def _open_warm(self) -> None:
+        try:
+            connection = RTUpstreamConnection(await self._connect(self.session, {}), warm=True)
+            connection.start_reading()
+            self._idle.append(connection)
+        except Exception as e:
+            logger.warning("Failed to open warm realtime connection: %s", e)
+        finally:
+            self._opening -= 1
+
+    async def _maintain(self) -> None:
+        while True:
+            for connection in [c for c in self._idle if not c.usable(self.max_idle)]:
+                self._idle.remove(connection)
+                await connection.close()
+            self._replenish()
+            await asyncio.sleep(min(self.max_idle / 2, 15))
+
+    async def close(self) -> None:
+        self._closed = True
+        for task in list(self._opening_tasks):
+            task.cancel()
+        await asyncio.gather(*self._opening_tasks, return_exceptions=True)
+        if self._maintainer is not None:
+            self._maintainer.cancel()
+            await asyncio.gather(self._maintainer, return_exceptions=True)
+            self._maintainer = None
+        while self._idle:
+            await self._idle.popleft().close()
+        if self._session is not None:
+            await self._session.close()
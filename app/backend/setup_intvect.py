@@ -1,7 +1,10 @@
 import json
 import logging
 import os
+import random
 import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from azure.core.exceptions import ResourceExistsError
 from azure.identity import AzureDeveloperCliCredential, get_bearer_token_provider
@@ -27,10 +30,10 @@ from azure.search.documents.indexes.models import (
 )
 from azure.storage.blob import BlobServiceClient
 from dotenv import load_dotenv
+from localsearch import faq_chunk_id, save_embeddings
 from rich.logging import RichHandler
-from openai import AzureOpenAI
-import uuid
-import json
+from openai import APIConnectionError, AzureOpenAI, InternalServerError, RateLimitError
+import numpy as np
 
 
 def load_azd_env():
@@ -49,7 +52,7 @@ def load_azd_env():
     load_dotenv(env_file_path, override=True)
 
 
-def setup_index(azure_credential, index_name, azure_search_endpoint, azure_storage_connection_string, azure_storage_container, azure_openai_embedding_endpoint, azure_openai_embedding_deployment, azure_openai_embedding_model, azure_openai_embeddings_dimensions):
+def setup_index(azure_credential, index_name, azure_search_endpoint, azure_storage_connection_string, azure_storage_container, azure_openai_embedding_endpoint, azure_openai_embedding_deployment, azure_openai_embedding_model, azure_openai_embeddings_dimensions, embeddings_path=None):
     index_client = SearchIndexClient(azure_search_endpoint, azure_credential)
 
     index_names = [index.name for index in index_client.list_indexes()]
@@ -102,40 +105,97 @@ def setup_index(azure_credential, index_name, azure_search_endpoint, azure_stora
                 )
             )
         )
-    upload_documents(azure_credential, index_name, azure_search_endpoint, azure_openai_embedding_endpoint, azure_openai_embedding_deployment)
-
-def upload_documents(azure_credential, index_name, azure_search_endpoint, azure_openai_embedding_endpoint, azure_openai_embedding_deployment):
+    upload_documents(azure_credential, index_name, azure_search_endpoint, azure_openai_embedding_endpoint, azure_openai_embedding_deployment,
+                     embeddings_path=embeddings_path)
+
+def generate_embeddings(openai_client, deployment, texts, max_attempts=6):
+    """Embed a batch of texts in one request, backing off and retrying when throttled (429) or on
+    transient failures (5xx, timeouts, connection errors)."""
+    for attempt in range(max_attempts):
+        try:
+            response = openai_client.embeddings.create(input=texts, model=deployment)
+            return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+        except (RateLimitError, InternalServerError, APIConnectionError) as e:
+            if attempt == max_attempts - 1:
+                raise
+            # APIConnectionError (and APITimeoutError, a subclass) has no response
+            response = getattr(e, "response", None)
+            retry_after = response.headers.get("retry-after") if response is not None else None
+            delay = float(retry_after) if retry_after else min(2 ** attempt, 60) * (1 + random.random())
+            reason = "throttled" if isinstance(e, RateLimitError) else f"failed ({type(e).__name__})"
+            logger.warning(f"Embeddings request {reason}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def upload_documents(azure_credential, index_name, azure_search_endpoint, azure_openai_embedding_endpoint, azure_openai_embedding_deployment,
+                     embedding_batch_size=16, embedding_concurrency=4, upload_batch_size=100,
+                     embeddings_path=None):
     search_client = SearchClient(endpoint=azure_search_endpoint, index_name=index_name, credential=azure_credential)
     openai_client = AzureOpenAI(
         azure_endpoint=azure_openai_embedding_endpoint,
         azure_deployment=azure_openai_embedding_deployment,
         azure_ad_token_provider=get_bearer_token_provider(azure_credential, "https://cognitiveservices.azure.com/.default"),
-        api_version="2023-05-15"
+        api_version="2023-05-15",
+        max_retries=0  # generate_embeddings handles throttling and transient errors
     )
 
-    def generate_embeddings(text):
-        response = openai_client.embeddings.create(
-            input=text,
-            model=azure_openai_embedding_deployment,
-        )
-        return response.data[0].embedding
-
     with open("data/faq.json", "r") as file:
         faq = json.load(file)
-        faq_documents = []
-
-        for i, item in enumerate(faq):
-            faq_documents.append({
-                "chunk_id": str(uuid.uuid4()),
-                "category": item["category"],
-                "title": item["title"],
-                "chunk": item["chunk"],
-                "text_vector": generate_embeddings(item["chunk"])
-            })
-        
-        search_client.upload_documents(faq_documents)
-        logger.info(f'Uploaded {len(faq_documents)} documents to Azure AI Search index {index_name}')
 
+    # Chunk ids are a hash of the content, so the keys already in the index are the manifest of what
+    # has been embedded: only new or edited items need embedding, and keys no longer produced by
+    # the source file belong to removed or edited items and are deleted
+    items = {faq_chunk_id(item): item for item in faq}
+    indexed = {r["chunk_id"] for r in search_client.search(search_text="*", select=["chunk_id"])}
+    changed = [chunk_id for chunk_id in items if chunk_id not in indexed]
+    removed = [chunk_id for chunk_id in indexed if chunk_id not in items]
+    logger.info(f"{len(changed)} new or changed, {len(removed)} removed, {len(items) - len(changed)} unchanged documents")
+
+    # Embed in batches with several requests in flight, and upload documents as soon as a full
+    # upload batch is ready so indexing overlaps with the remaining embedding calls
+    vectors = {}
+    pending = []
+    uploaded = 0
+    batches = [changed[start:start + embedding_batch_size] for start in range(0, len(changed), embedding_batch_size)]
+    with ThreadPoolExecutor(max_workers=embedding_concurrency) as executor:
+        futures = {executor.submit(generate_embeddings, openai_client, azure_openai_embedding_deployment, [items[chunk_id]["chunk"] for chunk_id in batch]): batch for batch in batches}
+        for future in as_completed(futures):
+            for chunk_id, vector in zip(futures[future], future.result()):
+                vectors[chunk_id] = vector
+                pending.append({
+                    "chunk_id": chunk_id,
+                    "category": items[chunk_id]["category"],
+                    "title": items[chunk_id]["title"],
+                    "chunk": items[chunk_id]["chunk"],
+                    "text_vector": vector
+                })
+            while len(pending) >= upload_batch_size:
+                search_client.merge_or_upload_documents(pending[:upload_batch_size])
+                uploaded += upload_batch_size
+                del pending[:upload_batch_size]
+    if pending:
+        search_client.merge_or_upload_documents(pending)
+        uploaded += len(pending)
+    logger.info(f'Uploaded {uploaded} documents to Azure AI Search index {index_name}')
+
+    for start in range(0, len(removed), upload_batch_size):
+        search_client.delete_documents([{"chunk_id": chunk_id} for chunk_id in removed[start:start + upload_batch_size]])
+    if removed:
+        logger.info(f'Deleted {len(removed)} documents from Azure AI Search index {index_name}')
+
+    # Keep the vectors for the in-process search backend (AZURE_SEARCH_BACKEND=local) when asked to,
+    # reusing the previous file for unchanged documents and only asking the index for ones it doesn't have
+    if not embeddings_path:
+        return
+    if os.path.exists(embeddings_path):
+        previous = np.load(embeddings_path)
+        for chunk_id, vector in zip(previous["ids"].tolist(), previous["vectors"]):
+            if chunk_id in items and chunk_id not in vectors:
+                vectors[chunk_id] = vector
+    for chunk_id in items:
+        if chunk_id not in vectors:
+            vectors[chunk_id] = search_client.get_document(chunk_id, selected_fields=["text_vector"])["text_vector"]
+    save_embeddings(embeddings_path, list(items), [vectors[chunk_id] for chunk_id in items])
 
 
 if __name__ == "__main__":
@@ -175,7 +235,8 @@ if __name__ == "__main__":
         azure_openai_embedding_endpoint=AZURE_OPENAI_EMBEDDING_ENDPOINT,
         azure_openai_embedding_deployment=AZURE_OPENAI_EMBEDDING_DEPLOYMENT,
         azure_openai_embedding_model=AZURE_OPENAI_EMBEDDING_MODEL,
-        azure_openai_embeddings_dimensions=EMBEDDINGS_DIMENSIONS)
+        azure_openai_embeddings_dimensions=EMBEDDINGS_DIMENSIONS,
+        embeddings_path=os.environ.get("AZURE_SEARCH_LOCAL_EMBEDDINGS_EXPORT"))
 
     # upload_documents(azure_credential,
     #     index_name=AZURE_SEARCH_INDEX,
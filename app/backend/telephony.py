@@ -0,0 +1,152 @@
+import logging
+import time
+
+import numpy as np
+
+logger = logging.getLogger("voicerag")
+
+TELEPHONY_RATE = 8000
+MODEL_RATE = 24000
+_FACTOR = MODEL_RATE // TELEPHONY_RATE
+
+# G.711 as in the ITU/Sun reference implementation. Decoding is a lookup in a 256 entry table,
+# encoding a lookup in a table over every int16 value, so both are a single numpy indexing op
+def _ulaw_decode_table() -> np.ndarray:
+    u = ~np.arange(256, dtype=np.int32) & 0xFF
+    t = (((u & 0x0F) << 3) + 0x84) << ((u & 0x70) >> 4)
+    return np.where(u & 0x80, 0x84 - t, t - 0x84).astype(np.int16)
+
+def _alaw_decode_table() -> np.ndarray:
+    a = np.arange(256, dtype=np.int32) ^ 0x55
+    seg = (a & 0x70) >> 4
+    t = (a & 0x0F) << 4
+    t = np.where(seg == 0, t + 8, (t + 0x108) << np.maximum(seg - 1, 0))
+    return np.where(a & 0x80, t, -t).astype(np.int16)
+
+def _ulaw_encode_table() -> np.ndarray:
+    pcm = np.arange(65536, dtype=np.uint32).astype(np.uint16).view(np.int16).astype(np.int32) >> 2
+    mask = np.where(pcm < 0, 0x7F, 0xFF)
+    pcm = np.minimum(np.abs(pcm), 8159) + (0x84 >> 2)
+    seg = np.searchsorted(np.array([0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF]), pcm)
+    uval = np.where(seg >= 8, 0x7F, (seg << 4) | ((pcm >> (np.minimum(seg, 7) + 1)) & 0x0F))
+    return (uval ^ mask).astype(np.uint8)
+
+def _alaw_encode_table() -> np.ndarray:
+    pcm = np.arange(65536, dtype=np.uint32).astype(np.uint16).view(np.int16).astype(np.int32) >> 3
+    mask = np.where(pcm >= 0, 0xD5, 0x55)
+    pcm = np.where(pcm >= 0, pcm, -pcm - 1)
+    seg = np.searchsorted(np.array([0x1F, 0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF]), pcm)
+    shift = np.where(seg < 2, 1, np.minimum(seg, 7))
+    aval = np.where(seg >= 8, 0x7F, (np.minimum(seg, 7) << 4) | ((pcm >> shift) & 0x0F))
+    return (aval ^ mask).astype(np.uint8)
+
+_DECODE_TABLES = {"ulaw": _ulaw_decode_table(), "alaw": _alaw_decode_table()}
+_ENCODE_TABLES = {"ulaw": _ulaw_encode_table(), "alaw": _alaw_encode_table()}
+
+def g711_decode(payload: bytes, encoding: str) -> np.ndarray:
+    return _DECODE_TABLES[encoding][np.frombuffer(payload, dtype=np.uint8)]
+
+def g711_encode(pcm: np.ndarray, encoding: str) -> bytes:
+    return _ENCODE_TABLES[encoding][pcm.astype(np.int16, copy=False).view(np.uint16)].tobytes()
+
+def lowpass_filter(taps: int, cutoff: float = 3600, rate: int = MODEL_RATE) -> np.ndarray:
+    """Windowed-sinc low-pass FIR at the model rate, taps is rounded up to a multiple of 3."""
+    taps += -taps % _FACTOR
+    n = np.arange(taps) - (taps - 1) / 2
+    h = np.sinc(2 * cutoff / rate * n) * np.hamming(taps)
+    return (h / h.sum()).astype(np.float32)
+
+class _Upsampler:
+    """8 kHz -> 24 kHz, polyphase: each of the 3 output phases is a short convolution of the input."""
+
+    def __init__(self, h: np.ndarray):
+        # Sized for the first (longest) filter, a shorter one later only reads the tail
+        self._history = np.zeros(len(h) // _FACTOR - 1, dtype=np.float32)
+        self.set_filter(h)
+
+    def set_filter(self, h: np.ndarray) -> None:
+        self._phases = [h[k::_FACTOR] * _FACTOR for k in range(_FACTOR)]
+
+    def process(self, x: np.ndarray) -> np.ndarray:
+        buffer = np.concatenate([self._history, x.astype(np.float32)])
+        start = len(self._history) - (len(self._phases[0]) - 1)
+        out = np.empty(len(x) * _FACTOR, dtype=np.float32)
+        for k, phase in enumerate(self._phases):
+            out[k::_FACTOR] = np.convolve(buffer[start:], phase, mode="valid")
+        self._history = buffer[len(x):]
+        return out
+
+class _Downsampler:
+    """24 kHz -> 8 kHz, low-pass then keep every third sample, carrying the phase across frames."""
+
+    def __init__(self, h: np.ndarray, history: int = 0):
+        self._history = np.zeros(max(history, len(h) - 1), dtype=np.float32)
+        self._offset = 0
+        self.set_filter(h)
+
+    def set_filter(self, h: np.ndarray) -> None:
+        self._h = h
+
+    def process(self, x: np.ndarray) -> np.ndarray:
+        buffer = np.concatenate([self._history, x.astype(np.float32)])
+        start = len(self._history) - (len(self._h) - 1)
+        out = np.convolve(buffer[start:], self._h, mode="valid")[self._offset::_FACTOR]
+        self._offset = (self._offset - len(x)) % _FACTOR
+        self._history = buffer[len(x):]
+        return out
+
+def _to_int16(x: np.ndarray) -> np.ndarray:
+    return np.clip(np.rint(x), -32768, 32767).astype(np.int16)
+
+class TelephonyCodec:
+    """Converts one call's audio between 8 kHz G.711 ("ulaw" or "alaw") and the realtime model's
+    24 kHz PCM16, with filter state carried across frames in both directions.
+
+    Conversion time is tracked against the audio it covers. When a call spends more than
+    max_cpu_ratio of real time converting (averaged over the last few seconds of audio), it
+    switches to a short filter for the rest of the call, trading some aliasing for a bounded cost.
+    """
+
+    def __init__(self, encoding: str, taps: int = 48, fallback_taps: int = 9, max_cpu_ratio: float = 0.02, window: float = 2.0):
+        if encoding not in _DECODE_TABLES:
+            raise ValueError(f"Unsupported telephony encoding: {encoding}")
+        self.encoding = encoding
+        self.max_cpu_ratio = max_cpu_ratio
+        self.window = window
+        self.degraded = False
+        self._fallback = lowpass_filter(fallback_taps)
+        h = lowpass_filter(taps)
+        self._up = _Upsampler(h)
+        self._down = _Downsampler(h)
+        self._cpu = 0.0
+        self._audio = 0.0
+
+    def _account(self, started_at: float, audio_seconds: float) -> None:
+        self._cpu += time.perf_counter() - started_at
+        self._audio += audio_seconds
+        if self._audio >= self.window:
+            if not self.degraded and self._cpu > self.max_cpu_ratio * self._audio:
+                logger.warning("Telephony conversion used %.1f%% of real time, switching to the short filter", 100 * self._cpu / self._audio)
+                self.degraded = True
+                self._up.set_filter(self._fallback)
+                self._down.set_filter(self._fallback)
+            self._cpu = 0.0
+            self._audio = 0.0
+
+    def decode(self, payload: bytes) -> bytes:
+        """G.711 at 8 kHz from the caller -> PCM16 at 24 kHz for the model."""
+        started_at = time.perf_counter()
+        pcm = _to_int16(self._up.process(g711_decode(payload, self.encoding))).tobytes()
+        self._account(started_at, len(payload) / TELEPHONY_RATE)
+        return pcm
+
+    def encode(self, pcm: bytes) -> bytes:
+        """PCM16 at 24 kHz from the model -> G.711 at 8 kHz for the caller."""
+        started_at = time.perf_counter()
+        payload = g711_encode(_to_int16(self._down.process(np.frombuffer(pcm, dtype=np.int16))), self.encoding)
+        self._account(started_at, len(pcm) / 2 / MODEL_RATE)
+        return payload
+
+    def reset_output(self) -> None:
+        # After a barge-in the next outbound audio is unrelated to what was being played
+        self._down = _Downsampler(self._down._h, len(self._down._history))
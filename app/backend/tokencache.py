@@ -0,0 +1,127 @@
+import asyncio
+import logging
+import threading
+import time
+from collections.abc import Awaitable
+from typing import Any, Callable
+
+from azure.core.credentials import AccessToken, TokenCredential
+
+logger = logging.getLogger("voicerag")
+
+COGNITIVE_SERVICES_SCOPE = "https://cognitiveservices.azure.com/.default"
+SEARCH_SCOPE = "https://search.azure.com/.default"
+
+class LazyCredential:
+    """Synchronous credential built by factory on first use.
+
+    azure.identity is slow to import, wrapped in AsyncTokenCache the import and construction run
+    in the worker thread of the first token request instead of delaying startup.
+    """
+
+    def __init__(self, factory: Callable[[], TokenCredential]):
+        self._factory = factory
+        self._credential = None
+        self._lock = threading.Lock()
+
+    @property
+    def credential(self) -> TokenCredential:
+        with self._lock:
+            if self._credential is None:
+                self._credential = self._factory()
+        return self._credential
+
+    def get_token(self, *scopes: str, **kwargs: Any) -> AccessToken:
+        return self.credential.get_token(*scopes, **kwargs)
+
+class AsyncTokenCache:
+    """Async credential that hands out cached tokens and refreshes them in the background.
+
+    Wraps a synchronous azure.identity credential. Token requests run in a worker thread so an
+    Azure AD round-trip never blocks the event loop, and each scope gets a refresher task that
+    renews the token ``refresh_margin`` seconds before it expires, so callers normally get a
+    cached token without awaiting anything. The margin stays below azure-identity's own 5 minute
+    refresh window, before that the wrapped credential returns the token it already has.
+    Implements the AsyncTokenCredential protocol and can be passed directly to the aio Azure SDK
+    clients.
+    """
+
+    def __init__(self, credential: TokenCredential, refresh_margin: float = 240, retry_delay: float = 10):
+        self._credential = credential
+        self._refresh_margin = refresh_margin
+        self._retry_delay = retry_delay
+        self._tokens: dict[tuple[str, ...], AccessToken] = {}
+        self._fetching: dict[tuple[str, ...], asyncio.Task] = {}
+        self._refreshers: dict[tuple[str, ...], asyncio.Task] = {}
+
+    async def get_token(self, *scopes: str, **kwargs: Any) -> AccessToken:
+        if kwargs.get("claims") or kwargs.get("tenant_id"):
+            # Claims challenges and tenant overrides are one-off requests, don't cache them
+            return await asyncio.to_thread(self._credential.get_token, *scopes, **kwargs)
+        token = self._tokens.get(scopes)
+        if token is not None and token.expires_on > time.time() + 30:
+            return token
+        return await asyncio.shield(self._fetch(scopes))
+
+    def bearer_token_provider(self, *scopes: str) -> Callable[[], Awaitable[str]]:
+        async def provider() -> str:
+            return (await self.get_token(*scopes)).token
+        return provider
+
+    def prefetch(self, *scopes: str) -> None:
+        """Start fetching (and keeping fresh) a token for scopes without waiting for it."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return  # No loop yet, the first get_token will fetch
+        self._fetch(scopes)
+
+    def _fetch(self, scopes: tuple[str, ...]) -> asyncio.Task:
+        # Concurrent misses for the same scopes share a single request
+        task = self._fetching.get(scopes)
+        if task is None:
+            task = asyncio.create_task(self._refresh(scopes))
+            self._fetching[scopes] = task
+            task.add_done_callback(lambda t: self._fetch_done(scopes, t))
+        return task
+
+    def _fetch_done(self, scopes: tuple[str, ...], task: asyncio.Task) -> None:
+        self._fetching.pop(scopes, None)
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning("Failed to get token for %s: %s", " ".join(scopes), task.exception())
+
+    async def _refresh(self, scopes: tuple[str, ...]) -> AccessToken:
+        token = await asyncio.to_thread(self._credential.get_token, *scopes)
+        self._tokens[scopes] = token
+        refresher = self._refreshers.get(scopes)
+        if refresher is None or refresher.done():
+            self._refreshers[scopes] = asyncio.create_task(self._refresh_loop(scopes))
+        return token
+
+    async def _refresh_loop(self, scopes: tuple[str, ...]) -> None:
+        while True:
+            token = self._tokens[scopes]
+            await asyncio.sleep(max(token.expires_on - time.time() - self._refresh_margin, 1))
+            try:
+                refreshed = await asyncio.shield(self._fetch(scopes))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Keep serving the current token while it's valid and try again shortly
+                await asyncio.sleep(self._retry_delay)
+                continue
+            if refreshed.expires_on <= token.expires_on:
+                # Got the same token back, the credential isn't renewing it yet. Wait before asking
+                # again rather than calling it (maybe an az/azd subprocess) every second
+                await asyncio.sleep(self._retry_delay)
+
+    async def close(self) -> None:
+        for task in list(self._refreshers.values()) + list(self._fetching.values()):
+            task.cancel()
+        self._refreshers.clear()
+
+    async def __aenter__(self) -> "AsyncTokenCache":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.close()
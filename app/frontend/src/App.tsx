@@ -21,6 +21,7 @@ function App() {
     const [selectedFile, setSelectedFile] = useState<GroundingFile | null>(null);
 
     const { startSession, addUserAudio, inputAudioBufferClear } = useRealTime({
+        useBinaryAudio: true,
         onWebSocketOpen: () => console.log("WebSocket connection opened"),
         onWebSocketClose: () => console.log("WebSocket connection closed"),
         onWebSocketError: event => console.error("WebSocket error:", event),
@@ -28,6 +29,9 @@ function App() {
         onReceivedResponseAudioDelta: message => {
             isRecording && playAudio(message.delta);
         },
+        onReceivedResponseAudio: pcm => {
+            isRecording && playAudioPcm(pcm);
+        },
         onReceivedInputAudioBufferSpeechStarted: () => {
             stopAudioPlayer();
         },
@@ -35,14 +39,32 @@ function App() {
             const result: ToolResult = JSON.parse(message.tool_result);
 
             const files: GroundingFile[] = result.sources.map(x => {
-                return { id: x.chunk_id, name: x.title, content: x.chunk };
+                return { id: x.chunk_id, name: x.title, content: x.chunk ?? "" };
             });
 
             setGroundingFiles(prev => [...prev, ...files]);
         }
     });
 
-    const { reset: resetAudioPlayer, play: playAudio, stop: stopAudioPlayer } = useAudioPlayer();
+    const onSelectFile = async (file: GroundingFile) => {
+        setSelectedFile(file);
+        if (file.content) {
+            return;
+        }
+
+        // Only a reference was sent, load the text the first time the source is opened
+        const response = await fetch(`/chunks/${encodeURIComponent(file.id)}`);
+        if (!response.ok) {
+            console.error("Failed to load grounding source", file.id, response.status);
+            return;
+        }
+        const chunk: { chunk: string } = await response.json();
+        const loaded = { ...file, content: chunk.chunk };
+        setGroundingFiles(prev => prev.map(f => (f.id === file.id ? loaded : f)));
+        setSelectedFile(current => (current?.id === file.id ? loaded : current));
+    };
+
+    const { reset: resetAudioPlayer, play: playAudio, playPcm: playAudioPcm, stop: stopAudioPlayer } = useAudioPlayer();
     const { start: startAudioRecording, stop: stopAudioRecording } = useAudioRecorder({ onAudioRecorded: addUserAudio });
 
     const onToggleListening = async () => {
@@ -89,7 +111,7 @@ function App() {
                     </Button>
                     <StatusMessage isRecording={isRecording} />
                 </div>
-                <GroundingFiles files={groundingFiles} onSelected={setSelectedFile} />
+                <GroundingFiles files={groundingFiles} onSelected={onSelectFile} />
             </main>
 
             <footer className="py-4 text-center">
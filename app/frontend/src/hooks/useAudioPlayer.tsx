@@ -15,8 +15,10 @@ export default function useAudioPlayer() {
     const play = (base64Audio: string) => {
         const binary = atob(base64Audio);
         const bytes = Uint8Array.from(binary, c => c.charCodeAt(0));
-        const pcmData = new Int16Array(bytes.buffer);
+        playPcm(new Int16Array(bytes.buffer));
+    };
 
+    const playPcm = (pcmData: Int16Array) => {
         audioPlayer.current?.play(pcmData);
     };
 
@@ -24,5 +26,5 @@ export default function useAudioPlayer() {
         audioPlayer.current?.stop();
     };
 
-    return { reset, play, stop };
+    return { reset, play, playPcm, stop };
 }
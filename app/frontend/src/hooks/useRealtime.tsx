@@ -12,8 +12,12 @@ import {
     ResponseInputAudioTranscriptionCompleted
 } from "@/types";
 
+// Middle tier sub-protocol where audio travels as binary frames of raw PCM16 instead of base64 JSON events
+const BINARY_AUDIO_PROTOCOL = "voicerag.binary-audio.v1";
+
 type Parameters = {
     useDirectAoaiApi?: boolean; // If true, the middle tier will be skipped and the AOAI ws API will be called directly
+    useBinaryAudio?: boolean; // Ignored with useDirectAoaiApi
     aoaiEndpointOverride?: string;
     aoaiApiKeyOverride?: string;
     aoaiModelOverride?: string;
@@ -25,6 +29,7 @@ type Parameters = {
     onWebSocketMessage?: (event: MessageEvent<any>) => void;
 
     onReceivedResponseAudioDelta?: (message: ResponseAudioDelta) => void;
+    onReceivedResponseAudio?: (pcm: Int16Array) => void; // audio deltas received as binary frames
     onReceivedInputAudioBufferSpeechStarted?: (message: Message) => void;
     onReceivedResponseDone?: (message: ResponseDone) => void;
     onReceivedExtensionMiddleTierToolResponse?: (message: ExtensionMiddleTierToolResponse) => void;
@@ -35,6 +40,7 @@ type Parameters = {
 
 export default function useRealTime({
     useDirectAoaiApi,
+    useBinaryAudio,
     aoaiEndpointOverride,
     aoaiApiKeyOverride,
     aoaiModelOverride,
@@ -45,6 +51,7 @@ export default function useRealTime({
     onWebSocketMessage,
     onReceivedResponseDone,
     onReceivedResponseAudioDelta,
+    onReceivedResponseAudio,
     onReceivedResponseAudioTranscriptDelta,
     onReceivedInputAudioBufferSpeechStarted,
     onReceivedExtensionMiddleTierToolResponse,
@@ -55,8 +62,16 @@ export default function useRealTime({
         ? `${aoaiEndpointOverride}/openai/realtime?api-key=${aoaiApiKeyOverride}&deployment=${aoaiModelOverride}&api-version=2024-10-01-preview`
         : `/realtime`;
 
-    const { sendJsonMessage } = useWebSocket(wsEndpoint, {
-        onOpen: () => onWebSocketOpen?.(),
+    const { sendJsonMessage, sendMessage, getWebSocket } = useWebSocket(wsEndpoint, {
+        protocols: useBinaryAudio && !useDirectAoaiApi ? BINARY_AUDIO_PROTOCOL : undefined,
+        onOpen: () => {
+            // ArrayBuffers arrive in order and synchronously, Blobs would need an async read per frame
+            const ws = getWebSocket();
+            if (ws) {
+                (ws as WebSocket).binaryType = "arraybuffer";
+            }
+            onWebSocketOpen?.();
+        },
         onClose: () => onWebSocketClose?.(),
         onError: event => onWebSocketError?.(event),
         onMessage: event => onMessageReceived(event),
@@ -82,10 +97,17 @@ export default function useRealTime({
         sendJsonMessage(command);
     };
 
-    const addUserAudio = (base64Audio: string) => {
+    const isBinaryAudio = () => getWebSocket()?.protocol === BINARY_AUDIO_PROTOCOL;
+
+    const addUserAudio = (pcm: Uint8Array) => {
+        if (isBinaryAudio()) {
+            sendMessage(pcm);
+            return;
+        }
+
         const command: InputAudioBufferAppendCommand = {
             type: "input_audio_buffer.append",
-            audio: base64Audio
+            audio: btoa(String.fromCharCode(...pcm))
         };
 
         sendJsonMessage(command);
@@ -102,6 +124,15 @@ export default function useRealTime({
     const onMessageReceived = (event: MessageEvent<any>) => {
         onWebSocketMessage?.(event);
 
+        if (event.data instanceof ArrayBuffer) {
+            onReceivedResponseAudio?.(new Int16Array(event.data));
+            return;
+        }
+        if (event.data instanceof Blob) {
+            event.data.arrayBuffer().then(buffer => onReceivedResponseAudio?.(new Int16Array(buffer)));
+            return;
+        }
+
         let message: Message;
         try {
             message = JSON.parse(event.data);
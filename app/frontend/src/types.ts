@@ -70,5 +70,5 @@ export type ExtensionMiddleTierToolResponse = {
 };
 
 export type ToolResult = {
-    sources: { chunk_id: string; title: string; chunk: string }[];
+    sources: { chunk_id: string; title: string; chunk?: string }[]; // chunk is omitted when the backend only sends references
 };
@@ -0,0 +1,292 @@
+"""Offline throughput and latency benchmark for RTMiddleTier.
+
+Starts a mock of the Azure OpenAI ``/openai/realtime`` WebSocket that replays a transcript of
+upstream events, runs the middle tier in a separate process (so its CPU and memory can be
+measured on their own) and drives N concurrent simulated clients through ``/realtime``.
+
+    python benchmarks/realtime_replay.py --clients 50 --turns 5
+    python benchmarks/realtime_replay.py --transcript recorded.json --json
+
+A transcript is a JSON object ``{"session": <session.created event>, "exchanges": [[[event, ...],
+...], ...]}``: each exchange is one user turn and holds the responses the model produces for it,
+one per ``response.create`` the mock receives (the first one usually ends with function calls,
+the next one is the answer after the tool outputs were posted). Without ``--transcript`` a
+synthetic one is generated from the command line options.
+"""
+import argparse
+import asyncio
+import base64
+import itertools
+import json
+import multiprocessing
+import os
+import resource
+import socket
+import sys
+import time
+from pathlib import Path
+
+import aiohttp
+from aiohttp import web
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "app" / "backend"
+
+
+def synthetic_transcript(audio_deltas: int, delta_bytes: int, tool_calls: list[str]) -> dict:
+    audio = base64.b64encode(os.urandom(delta_bytes)).decode("ascii")
+
+    def audio_response(response_id: str) -> list[dict]:
+        events = [{"type": "response.created", "response": {"id": response_id, "status": "in_progress", "output": []}}]
+        events += [{"type": "response.audio.delta", "response_id": response_id, "item_id": f"{response_id}_audio",
+                    "output_index": 0, "content_index": 0, "delta": audio} for _ in range(audio_deltas)]
+        events.append({"type": "response.audio.done", "response_id": response_id, "item_id": f"{response_id}_audio"})
+        events.append({"type": "response.done", "response": {"id": response_id, "status": "completed",
+                                                              "output": [{"type": "message", "id": f"{response_id}_audio"}]}})
+        return events
+
+    def tool_response(response_id: str) -> list[dict]:
+        events = [{"type": "response.created", "response": {"id": response_id, "status": "in_progress", "output": []}}]
+        output = []
+        for i, name in enumerate(tool_calls):
+            item = {"type": "function_call", "id": f"{response_id}_fc{i}", "call_id": f"{response_id}_call{i}",
+                    "name": name, "arguments": json.dumps({"query": "baggage allowance"})}
+            events.append({"type": "response.output_item.added", "output_index": i, "item": {**item, "arguments": ""}})
+            events.append({"type": "conversation.item.created", "previous_item_id": "user_item", "item": {**item, "arguments": ""}})
+            events.append({"type": "response.function_call_arguments.done", "call_id": item["call_id"], "arguments": item["arguments"]})
+            events.append({"type": "response.output_item.done", "output_index": i, "item": item})
+            output.append(item)
+        events.append({"type": "response.done", "response": {"id": response_id, "status": "completed", "output": output}})
+        return events
+
+    exchange = ([tool_response("resp_tool")] if tool_calls else []) + [audio_response("resp_audio")]
+    return {
+        "session": {"type": "session.created", "session": {"id": "sess_bench", "model": "bench", "instructions": "",
+                                                           "tools": [], "voice": "alloy", "tool_choice": "auto"}},
+        "exchanges": [exchange],
+    }
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+class MockRealtimeUpstream:
+    """Stands in for /openai/realtime, replaying the transcript one response per response.create."""
+
+    def __init__(self, transcript: dict, pace: float):
+        self.session_created = transcript["session"]
+        self.responses = [response for exchange in transcript["exchanges"] for response in exchange]
+        self.pace = pace
+        self.tool_turnaround: list[float] = []
+        self.frames_sent = 0
+        self.frames_received = 0
+
+    async def handler(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(request)
+        await ws.send_json(self.session_created)
+        responses = itertools.cycle(self.responses)
+        tools_done_at = None
+        async for msg in ws:
+            if msg.type != aiohttp.WSMsgType.TEXT:
+                continue
+            self.frames_received += 1
+            if json.loads(msg.data)["type"] != "response.create":
+                continue
+            if tools_done_at is not None:
+                self.tool_turnaround.append(time.perf_counter() - tools_done_at)
+                tools_done_at = None
+            for event in next(responses):
+                if event["type"] == "response.audio.delta":
+                    event = {**event, "bench_sent_at": time.perf_counter()}
+                    if self.pace:
+                        await asyncio.sleep(self.pace)
+                await ws.send_str(json.dumps(event))
+                self.frames_sent += 1
+                if event["type"] == "response.output_item.done" and event["item"]["type"] == "function_call":
+                    tools_done_at = time.perf_counter()
+        return ws
+
+
+def run_middle_tier(port: int, upstream: str, tool_names: list[str], tool_latency: float, warm_connections: int) -> None:
+    sys.path.insert(0, str(BACKEND_DIR))
+    from azure.core.credentials import AzureKeyCredential
+
+    from rtmt import RTMiddleTier, Tool, ToolResult, ToolResultDirection
+
+    def fake_tool(name: str):
+        async def target(args):
+            await asyncio.sleep(tool_latency)
+            return ToolResult({"result": f"{name} result", "args": args}, ToolResultDirection.TO_SERVER)
+        return Tool(target=target, schema={"type": "function", "name": name, "parameters": {"type": "object", "properties": {}}})
+
+    async def stats(_request):
+        with open("/proc/self/statm") as statm:
+            rss = int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        return web.json_response({"cpu": time.process_time(), "rss": rss,
+                                  "max_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024})
+
+    app = web.Application()
+    rtmt = RTMiddleTier(endpoint=upstream, deployment="bench", credentials=AzureKeyCredential("bench"))
+    rtmt.system_message = "You are a benchmark."
+    rtmt.warm_connections = warm_connections
+    for name in tool_names:
+        rtmt.tools[name] = fake_tool(name)
+    rtmt.attach_to_app(app, "/realtime")
+    app.router.add_get("/bench/stats", stats)
+    web.run_app(app, host="127.0.0.1", port=port, print=None, access_log=None)
+
+
+async def run_client(url: str, transcript: dict, turns: int, appends: int, append_bytes: int, binary_audio: bool, telephony: str, results: dict) -> None:
+    # A telephony gateway sends 20 ms frames of 8 kHz G.711, a browser chunks of 24 kHz PCM16
+    pcm = os.urandom(160 if telephony else append_bytes)
+    append = json.dumps({"type": "input_audio_buffer.append", "audio": base64.b64encode(pcm).decode("ascii")})
+    responses_per_turn = [len(exchange) for exchange in transcript["exchanges"]]
+    protocols = (f"voicerag.g711-{telephony}.v1",) if telephony else ("voicerag.binary-audio.v1",) if binary_audio else ()
+    async with aiohttp.ClientSession() as session:
+        async with session.ws_connect(url, max_msg_size=0, protocols=protocols) as ws:
+            await ws.send_json({"type": "session.update", "session": {"turn_detection": {"type": "server_vad"}}})
+            started = time.perf_counter()
+            for turn in range(turns):
+                for _ in range(appends):
+                    if binary_audio or telephony:
+                        await ws.send_bytes(pcm)
+                        results["client_bytes"] += len(pcm)
+                    else:
+                        await ws.send_str(append)
+                        results["client_bytes"] += len(append)
+                await ws.send_json({"type": "response.create"})
+                remaining = responses_per_turn[turn % len(responses_per_turn)]
+                first_audio = None
+                turn_started = time.perf_counter()
+                async for msg in ws:
+                    if msg.type == aiohttp.WSMsgType.BINARY:
+                        # Audio delta as raw PCM, there is no bench_sent_at to measure relay latency with
+                        results["frames"] += 1
+                        results["client_bytes"] += len(msg.data)
+                        if first_audio is None:
+                            first_audio = time.perf_counter()
+                            results["first_audio"].append(first_audio - turn_started)
+                        continue
+                    if msg.type != aiohttp.WSMsgType.TEXT:
+                        break
+                    results["frames"] += 1
+                    results["client_bytes"] += len(msg.data)
+                    event = json.loads(msg.data)
+                    if "bench_sent_at" in event:
+                        now = time.perf_counter()
+                        results["relay_latency"].append(now - event["bench_sent_at"])
+                        if first_audio is None:
+                            first_audio = now
+                            results["first_audio"].append(now - turn_started)
+                    elif event["type"] == "response.done":
+                        remaining -= 1
+                        if remaining == 0:
+                            break
+            results["session_time"].append(time.perf_counter() - started)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def benchmark(args: argparse.Namespace) -> dict:
+    if args.transcript:
+        with open(args.transcript) as file:
+            transcript = json.load(file)
+    else:
+        transcript = synthetic_transcript(args.audio_deltas, args.delta_bytes, args.tools)
+    tool_names = sorted({event["item"]["name"] for exchange in transcript["exchanges"] for response in exchange
+                         for event in response if event["type"] == "response.output_item.done" and event["item"]["type"] == "function_call"})
+
+    mock = MockRealtimeUpstream(transcript, args.pace / 1000)
+    mock_app = web.Application()
+    mock_app.router.add_get("/openai/realtime", mock.handler)
+    runner = web.AppRunner(mock_app, access_log=None)
+    await runner.setup()
+    mock_port, tier_port = free_port(), free_port()
+    await web.TCPSite(runner, "127.0.0.1", mock_port).start()
+
+    middle_tier = multiprocessing.get_context("spawn").Process(
+        target=run_middle_tier, args=(tier_port, f"http://127.0.0.1:{mock_port}", tool_names, args.tool_latency / 1000, args.warm_connections), daemon=True)
+    middle_tier.start()
+    try:
+        async with aiohttp.ClientSession() as session:
+            for _ in range(200):
+                try:
+                    async with session.get(f"http://127.0.0.1:{tier_port}/bench/stats") as response:
+                        before = await response.json()
+                    break
+                except aiohttp.ClientConnectionError:
+                    await asyncio.sleep(0.05)
+            else:
+                raise RuntimeError("middle tier did not start")
+
+            results = {"frames": 0, "client_bytes": 0, "relay_latency": [], "first_audio": [], "session_time": []}
+            started = time.perf_counter()
+            await asyncio.gather(*[run_client(f"http://127.0.0.1:{tier_port}/realtime", transcript, args.turns,
+                                              args.appends, args.delta_bytes, args.binary_audio, args.telephony, results) for _ in range(args.clients)])
+            elapsed = time.perf_counter() - started
+
+            async with session.get(f"http://127.0.0.1:{tier_port}/bench/stats") as response:
+                after = await response.json()
+    finally:
+        middle_tier.terminate()
+        middle_tier.join()
+        await runner.cleanup()
+
+    def ms(seconds: float) -> float:
+        return round(seconds * 1000, 3)
+
+    return {
+        "clients": args.clients,
+        "turns": args.turns,
+        "elapsed_s": round(elapsed, 3),
+        "frames_to_clients": results["frames"],
+        "frames_to_upstream": mock.frames_received,
+        "frames_per_s": round((results["frames"] + mock.frames_received) / elapsed, 1),
+        "client_mb": round(results["client_bytes"] / 1024 / 1024, 2),
+        "relay_latency_p50_ms": ms(percentile(results["relay_latency"], 50)),
+        "relay_latency_p99_ms": ms(percentile(results["relay_latency"], 99)),
+        "first_audio_p50_ms": ms(percentile(results["first_audio"], 50)),
+        "first_audio_p99_ms": ms(percentile(results["first_audio"], 99)),
+        "tool_turnaround_p50_ms": ms(percentile(mock.tool_turnaround, 50)),
+        "tool_turnaround_p99_ms": ms(percentile(mock.tool_turnaround, 99)),
+        "cpu_per_session_ms": ms((after["cpu"] - before["cpu"]) / args.clients),
+        "rss_per_session_kb": round(max(after["rss"] - before["rss"], 0) / args.clients / 1024, 1),
+        "peak_rss_mb": round(after["max_rss"] / 1024 / 1024, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=20, help="concurrent simulated clients")
+    parser.add_argument("--turns", type=int, default=3, help="user turns per client")
+    parser.add_argument("--transcript", help="JSON transcript of upstream events to replay")
+    parser.add_argument("--audio-deltas", type=int, default=200, help="audio deltas per synthetic answer")
+    parser.add_argument("--delta-bytes", type=int, default=4800, help="PCM bytes per audio delta/append")
+    parser.add_argument("--appends", type=int, default=50, help="input_audio_buffer.append frames sent per turn")
+    parser.add_argument("--tools", nargs="*", default=["search", "get_bookings"], help="function calls in each synthetic turn")
+    parser.add_argument("--tool-latency", type=float, default=20, help="simulated tool latency (ms)")
+    parser.add_argument("--pace", type=float, default=0, help="delay between replayed audio deltas (ms), 0 floods")
+    parser.add_argument("--warm-connections", type=int, default=0, help="pre-opened upstream sockets kept by the middle tier")
+    parser.add_argument("--binary-audio", action="store_true", help="clients use the binary audio sub-protocol")
+    parser.add_argument("--telephony", choices=["ulaw", "alaw"], help="clients act as a telephony gateway streaming G.711")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(benchmark(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for key, value in results.items():
+            print(f"{key:>24}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Cold start time of the backend, from process spawn to the first answered HTTP request.
+
+Each run starts a fresh interpreter that imports app.py, awaits create_app and serves it, while
+this script polls /metrics until it answers. Azure endpoints point at placeholders: credentials
+and search warm-ups fail in the background, which is fine since they must not hold up startup.
+The frontend doesn't need to be built, an empty app/backend/static is created when it's missing.
+
+    python benchmarks/startup_time.py
+    python benchmarks/startup_time.py --runs 10 --auth key --max-ready-ms 1500
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "app" / "backend"
+
+LAUNCHER = """
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import app
+from aiohttp import web
+imported = time.perf_counter()
+
+async def timed_create_app():
+    application = await app.create_app()
+    created = time.perf_counter()
+    print(json.dumps({"import_ms": (imported - started) * 1000, "create_app_ms": (created - imported) * 1000}), flush=True)
+    return application
+
+web.run_app(timed_create_app(), host="127.0.0.1", port=int(sys.argv[2]), print=None, access_log=None)
+"""
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def benchmark_env(auth: str) -> dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "RUNNING_IN_PRODUCTION": "true",
+        "AZURE_OPENAI_ENDPOINT": "https://example.openai.azure.com",
+        "AZURE_OPENAI_REALTIME_DEPLOYMENT": "gpt-4o-realtime-preview",
+        "AZURE_SEARCH_ENDPOINT": "https://example.search.windows.net",
+        "AZURE_SEARCH_INDEX": "bench",
+        "AZURE_API_ENDPOINT": "http://127.0.0.1:9",
+    })
+    for key in ("AZURE_OPENAI_API_KEY", "AZURE_SEARCH_API_KEY", "AZURE_TENANT_ID"):
+        env.pop(key, None)
+    if auth == "key":
+        env["AZURE_OPENAI_API_KEY"] = env["AZURE_SEARCH_API_KEY"] = "benchmark"
+    return env
+
+
+def run_once(env: dict[str, str], timeout: float) -> dict:
+    port = free_port()
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-c", LAUNCHER, str(BACKEND_DIR), str(port)], env=env,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        while True:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=1) as response:
+                    response.read()
+                break
+            except (urllib.error.URLError, ConnectionError):
+                if process.poll() is not None:
+                    raise RuntimeError("backend exited during startup")
+                if time.perf_counter() - started > timeout:
+                    raise RuntimeError(f"backend did not answer within {timeout}s")
+                time.sleep(0.005)
+        ready_ms = (time.perf_counter() - started) * 1000
+        timings = json.loads(process.stdout.readline())
+    finally:
+        process.terminate()
+        process.wait()
+    return {"ready_ms": ready_ms, **timings}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--auth", choices=["identity", "key"], default="identity", help="managed identity/az login or API keys")
+    parser.add_argument("--timeout", type=float, default=30, help="seconds to wait for a single start")
+    parser.add_argument("--max-ready-ms", type=float, help="exit with status 1 when the median start is slower than this")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    (BACKEND_DIR / "static").mkdir(exist_ok=True)
+    env = benchmark_env(args.auth)
+    runs = [run_once(env, args.timeout) for _ in range(args.runs)]
+    result = {"runs": args.runs, "auth": args.auth}
+    for key in ("ready_ms", "import_ms", "create_app_ms"):
+        values = [run[key] for run in runs]
+        result[f"{key[:-3]}_median_ms"] = round(statistics.median(values), 1)
+        result[f"{key[:-3]}_max_ms"] = round(max(values), 1)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        for key, value in result.items():
+            print(f"{key:>24}: {value}")
+    if args.max_ready_ms is not None and result["ready_median_ms"] > args.max_ready_ms:
+        print(f"Median start {result['ready_median_ms']} ms is over the {args.max_ready_ms} ms budget", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
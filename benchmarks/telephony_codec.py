@@ -0,0 +1,86 @@
+"""CPU cost of the telephony audio pipeline, and how many concurrent calls one core sustains.
+
+Feeds a call's worth of audio through TelephonyCodec in 20 ms frames, the way a telephony gateway
+streams it: caller audio as 8 kHz G.711 up to the model's 24 kHz PCM16, and the model's answer
+back down. Both directions run for the whole call (full duplex), which is the worst case, since
+in a real conversation the model mostly talks while the caller listens.
+
+    python benchmarks/telephony_codec.py
+    python benchmarks/telephony_codec.py --encoding alaw --seconds 60 --json
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "app" / "backend"))
+from telephony import MODEL_RATE, TELEPHONY_RATE, TelephonyCodec, g711_encode  # noqa: E402
+
+
+def speech_like(seconds: float, rate: int, seed: int) -> np.ndarray:
+    # Band-limited noise with a syllable-rate envelope, closer to speech than a pure tone
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * rate)) / rate
+    noise = np.convolve(rng.standard_normal(len(t)), np.hanning(9), mode="same")
+    envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 4 * t) ** 2
+    return np.clip(noise * envelope * 4000, -32768, 32767).astype(np.int16)
+
+
+def run(encoding: str, seconds: float, frame_ms: int, taps: int, fallback: bool) -> dict:
+    inbound = g711_encode(speech_like(seconds, TELEPHONY_RATE, 1), encoding)
+    outbound = speech_like(seconds, MODEL_RATE, 2).tobytes()
+    in_frame = TELEPHONY_RATE * frame_ms // 1000
+    out_frame = MODEL_RATE * frame_ms // 1000 * 2
+
+    # No CPU budget here, the point is to measure the cost of the chosen filter
+    taps = 9 if fallback else taps
+    codec = TelephonyCodec(encoding, taps=taps, fallback_taps=taps, max_cpu_ratio=float("inf"))
+    frames = 0
+    started = time.process_time()
+    for i in range(0, len(inbound), in_frame):
+        codec.decode(inbound[i:i + in_frame])
+        frames += 1
+    decode_cpu = time.process_time() - started
+    started = time.process_time()
+    for i in range(0, len(outbound), out_frame):
+        codec.encode(outbound[i:i + out_frame])
+        frames += 1
+    encode_cpu = time.process_time() - started
+
+    cpu_ratio = (decode_cpu + encode_cpu) / seconds
+    return {
+        "encoding": encoding,
+        "filter_taps": taps,
+        "audio_s": seconds,
+        "frames": frames,
+        "decode_us_per_frame": round(decode_cpu / (frames / 2) * 1e6, 1),
+        "encode_us_per_frame": round(encode_cpu / (frames / 2) * 1e6, 1),
+        "cpu_percent_per_call": round(cpu_ratio * 100, 3),
+        "calls_per_core": int(1 / cpu_ratio) if cpu_ratio > 0 else None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--encoding", choices=["ulaw", "alaw"], default="ulaw")
+    parser.add_argument("--seconds", type=float, default=30, help="audio per direction")
+    parser.add_argument("--frame-ms", type=int, default=20, help="frame duration, gateways usually send 20 ms")
+    parser.add_argument("--taps", type=int, default=48, help="resampling filter length")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    results = [run(args.encoding, args.seconds, args.frame_ms, args.taps, fallback) for fallback in (False, True)]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for result, label in zip(results, ("", " (CPU budget fallback)")):
+        print(f"{result['filter_taps']}-tap filter{label}")
+        for key, value in result.items():
+            print(f"  {key:>22}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,7 @@ $azureSearchTitleField = azd env get-value AZURE_SEARCH_TITLE_FIELD
 $azureSearchContentField = azd env get-value AZURE_SEARCH_CONTENT_FIELD
 $azureSearchEmbeddingField = azd env get-value AZURE_SEARCH_EMBEDDING_FIELD
 $azureSearchUseVectorQuery = azd env get-value AZURE_SEARCH_USE_VECTOR_QUERY
+$azureSearchGroundingReferencesOnly = azd env get-value AZURE_SEARCH_GROUNDING_REFERENCES_ONLY
 
 Add-Content -Path $envFilePath -Value "AZURE_OPENAI_ENDPOINT=$azureOpenAiEndpoint"
 Add-Content -Path $envFilePath -Value "AZURE_OPENAI_REALTIME_DEPLOYMENT=$azureOpenAiRealtimeDeployment"
@@ -29,4 +30,5 @@ Add-Content -Path $envFilePath -Value "AZURE_SEARCH_TITLE_FIELD=$azureSearchTitl
 Add-Content -Path $envFilePath -Value "AZURE_SEARCH_CONTENT_FIELD=$azureSearchContentField"
 Add-Content -Path $envFilePath -Value "AZURE_SEARCH_EMBEDDING_FIELD=$azureSearchEmbeddingField"
 Add-Content -Path $envFilePath -Value "AZURE_SEARCH_USE_VECTOR_QUERY=$azureSearchUseVectorQuery"
+Add-Content -Path $envFilePath -Value "AZURE_SEARCH_GROUNDING_REFERENCES_ONLY=$azureSearchGroundingReferencesOnly"
 Add-Content -Path $envFilePath -Value "AZURE_TENANT_ID=$azureTenantId"